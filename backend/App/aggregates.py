@@ -0,0 +1,70 @@
+# app/aggregates.py
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import Activity, City, ExpenseCategory, ItineraryStop, Trip
+
+# Spend aggregation done by the database.
+# Every number here is a GROUP BY over activity JOIN itinerarystop, so the cost
+# of a trip's totals no longer depends on how many Activity rows we hydrate.
+
+async def trip_totals(session: AsyncSession, trip_ids: Iterable[int]) -> Dict[int, float]:
+    """total_spent for each trip id (trips without activities are omitted)."""
+    trip_ids = list(trip_ids)
+    if not trip_ids:
+        return {}
+    statement = (
+        select(ItineraryStop.trip_id, func.sum(Activity.cost))
+        .join(Activity, Activity.stop_id == ItineraryStop.id)
+        .where(ItineraryStop.trip_id.in_(trip_ids))
+        .group_by(ItineraryStop.trip_id)
+    )
+    return {trip_id: total or 0.0 for trip_id, total in (await session.exec(statement)).all()}
+
+async def trip_total(session: AsyncSession, trip_id: int) -> float:
+    return (await trip_totals(session, [trip_id])).get(trip_id, 0.0)
+
+async def category_breakdown(session: AsyncSession, trip_id: int) -> Dict[str, float]:
+    statement = (
+        select(Activity.category, func.sum(Activity.cost))
+        .join(ItineraryStop, Activity.stop_id == ItineraryStop.id)
+        .where(ItineraryStop.trip_id == trip_id)
+        .group_by(Activity.category)
+    )
+    breakdown = {}
+    for category, amount in (await session.exec(statement)).all():
+        name = category.value if category else ExpenseCategory.OTHER.value
+        breakdown[name] = breakdown.get(name, 0) + (amount or 0.0)
+    return breakdown
+
+async def city_breakdown(session: AsyncSession, trip_id: int) -> List[dict]:
+    # Outer join so stops without activities still show up with 0
+    statement = (
+        select(City.name, func.coalesce(func.sum(Activity.cost), 0.0))
+        .select_from(ItineraryStop)
+        .join(City, ItineraryStop.city_id == City.id)
+        .outerjoin(Activity, Activity.stop_id == ItineraryStop.id)
+        .where(ItineraryStop.trip_id == trip_id)
+        .group_by(ItineraryStop.id, City.name)
+        .order_by(ItineraryStop.id)
+    )
+    return [
+        {"city": name, "amount": amount}
+        for name, amount in (await session.exec(statement)).all()
+    ]
+
+async def trip_stats(session: AsyncSession, trip: Trip) -> dict:
+    """Payload for GET /trips/{trip_id}/stats."""
+    categories = await category_breakdown(session, trip.id)
+    total_spent = sum(categories.values())
+    total_budget = trip.budget_limit
+    return {
+        "total_budget": total_budget,
+        "total_spent": total_spent,
+        "remaining_budget": total_budget - total_spent,
+        "category_breakdown": categories,
+        "city_breakdown": await city_breakdown(session, trip.id)
+    }
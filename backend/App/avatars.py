@@ -0,0 +1,184 @@
+# app/avatars.py
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import anyio
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .models import User
+from .storage import STATIC_PREFIX, local_path, store
+
+# Avatar uploads.
+# The upload is streamed into content-addressed storage (storage.py) in chunks
+# through async file I/O, capped at settings.avatar_max_bytes, and only kept
+# if its first bytes are a known image format. Small square WebP + JPEG variants are then rendered by a
+# background worker (Pillow in a thread) and stored on User.avatar_variants:
+#   {"64": {"webp": "/static/..._64.webp", "jpeg": "/static/..._64.jpg"}, ...}
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    # Trust the bytes, not the client's filename or Content-Type
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+def _too_large():
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Avatar must be at most {settings.avatar_max_bytes // 1024} KB"
+    )
+
+async def save_avatar(upload: UploadFile) -> str:
+    """Store the upload and return its /static URL. The caller must retain()
+    it (storage.py) in the transaction that saves the URL."""
+    max_bytes = settings.avatar_max_bytes
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large()
+
+    first = await upload.read(CHUNK_SIZE)
+    extension = sniff_extension(first)
+    if extension is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Avatar must be a JPEG, PNG, GIF or WebP image"
+        )
+
+    async def chunks():
+        chunk = first
+        while chunk:
+            yield chunk
+            chunk = await upload.read(CHUNK_SIZE)
+
+    return await store(chunks(), extension, max_bytes, _too_large)
+
+# --- VARIANTS ---
+
+def _save(image: Image.Image, url: str, format: str, **options):
+    # Write-then-rename: a crash never leaves a truncated variant that
+    # later looks "already rendered"
+    path = local_path(url)
+    partial = path.with_name(f".{path.name}.part")
+    image.save(partial, format, **options)
+    os.replace(partial, path)
+
+def render_variants(source: Path, sizes: List[int]) -> dict:
+    """CPU-bound: runs in a worker thread. Variant names derive from the
+    content-addressed source name, so a deduplicated upload reuses them."""
+    variants = {
+        str(size): {
+            "webp": f"{STATIC_PREFIX}{source.stem}_{size}.webp",
+            "jpeg": f"{STATIC_PREFIX}{source.stem}_{size}.jpg",
+        }
+        for size in sizes
+    }
+    if all(local_path(url).exists() for urls in variants.values() for url in urls.values()):
+        return variants
+
+    with Image.open(source) as image:
+        # JPEG only: decode at a reduced scale when the target is much smaller
+        image.draft("RGB", (max(sizes) * 2, max(sizes) * 2))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "P")
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        for size in sizes:
+            thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            urls = variants[str(size)]
+            _save(thumb, urls["webp"], "WEBP", quality=80, method=4)
+            if has_alpha:
+                # JPEG has no alpha: flatten onto white
+                flat = Image.new("RGB", thumb.size, (255, 255, 255))
+                flat.paste(thumb, mask=thumb.getchannel("A"))
+                thumb = flat
+            _save(thumb, urls["jpeg"], "JPEG", quality=85, optimize=True, progressive=True)
+    return variants
+
+class VariantWorker:
+    """Background queue of (user_id, avatar_url) jobs, started in the lifespan."""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._engine: Optional[AsyncEngine] = None
+
+    async def start(self, engine: AsyncEngine):
+        self._engine = engine
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        # Catch up on avatars whose variants were never made (crash, full queue)
+        async with AsyncSession(engine) as session:
+            statement = select(User.id, User.avatar_url).where(
+                User.avatar_url.startswith(STATIC_PREFIX),
+                User.avatar_variants.is_(None)
+            )
+            for user_id, avatar_url in (await session.exec(statement)).all():
+                if not self.enqueue(user_id, avatar_url):
+                    break
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, user_id: int, avatar_url: str) -> bool:
+        """Call after committing the new avatar_url. Never blocks."""
+        if self._queue is None or local_path(avatar_url) is None:
+            return False
+        try:
+            self._queue.put_nowait((user_id, avatar_url))
+        except asyncio.QueueFull:
+            # The original is still served; the next startup retries
+            logger.warning("Avatar variant queue full, skipping user %s", user_id)
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            user_id, avatar_url = await self._queue.get()
+            try:
+                await self._process(user_id, avatar_url)
+            except Exception:
+                logger.exception("Avatar variants failed for user %s", user_id)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, user_id: int, avatar_url: str):
+        from .oauth2 import invalidate_user
+
+        source = local_path(avatar_url)
+        if source is None or not await anyio.Path(source).exists():
+            return
+        variants = await run_in_threadpool(render_variants, source, settings.avatar_variant_sizes)
+
+        async with AsyncSession(self._engine) as session:
+            user = await session.get(User, user_id)
+            # A newer upload may have replaced this avatar while we worked
+            if user is None or user.avatar_url != avatar_url:
+                return
+            user.avatar_variants = variants
+            session.add(user)
+            await session.commit()
+        invalidate_user(user_id)
+
+# One worker pool per process
+variant_worker = VariantWorker(settings.avatar_variant_workers, settings.avatar_queue_size)
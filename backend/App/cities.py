@@ -0,0 +1,67 @@
+# app/cities.py
+from typing import Dict, Iterable
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import City
+
+# City resolution: "Where to?" strings -> City rows.
+# Names match case-insensitively on City.name_key, which holds city_key(name)
+# (unique ix_city_name_key index). The key is computed here rather than with
+# SQL lower(), which only folds ASCII on SQLite. All names are resolved with
+# one SELECT and the missing ones are created with one INSERT ... ON CONFLICT
+# DO NOTHING, so two requests creating the same new city at once both end up
+# with the same row.
+
+DEFAULT_COUNTRY = "Unknown"
+
+def city_key(name: str) -> str:
+    return name.strip().lower()
+
+async def _select_cities(session: AsyncSession, keys) -> Dict[str, City]:
+    statement = select(City).where(City.name_key.in_(keys))
+    return {city.name_key: city for city in (await session.exec(statement)).all()}
+
+async def _insert_missing(session: AsyncSession, rows):
+    dialect = session.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        await session.exec(insert(City).values(rows).on_conflict_do_nothing())
+        return
+
+    # No portable ON CONFLICT: one savepoint per row instead
+    for row in rows:
+        try:
+            async with session.begin_nested():
+                session.add(City(**row))
+        except IntegrityError:
+            pass
+
+async def resolve_cities(session: AsyncSession, names: Iterable[str]) -> Dict[str, City]:
+    """Get or create a City for every name. Returns {city_key(name): City}.
+    Runs inside the caller's transaction; the caller commits."""
+    wanted = {}
+    for name in names:
+        key = city_key(name)
+        if key:
+            wanted.setdefault(key, name.strip())
+    if not wanted:
+        return {}
+
+    cities = await _select_cities(session, list(wanted))
+    missing = [key for key in wanted if key not in cities]
+    if missing:
+        await _insert_missing(
+            session,
+            [{"name": wanted[key], "name_key": key, "country": DEFAULT_COUNTRY} for key in missing]
+        )
+        # Rows skipped by ON CONFLICT belong to a concurrent creator; read them back too
+        cities.update(await _select_cities(session, missing))
+        unresolved = [wanted[key] for key in missing if key not in cities]
+        if unresolved:
+            raise RuntimeError(f"Cities neither found nor created: {', '.join(unresolved)}")
+    return cities
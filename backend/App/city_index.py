@@ -0,0 +1,309 @@
+# app/city_index.py
+import bisect
+import heapq
+import threading
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import City, ItineraryStop
+
+# In-process autocomplete index over the City table.
+#
+# Prefix matching uses a sorted array of normalized names: every name under a
+# prefix sits in one contiguous bisect range, i.e. a trie flattened into a
+# list, at a fraction of the memory of per-character node objects. Prefixes
+# covering a large range (short ones, mostly) get a precomputed top-K that is
+# kept up to date in place as usage changes. Cities added after the load go
+# into a second, small sorted array that queries bisect as well. It is merged
+# into the main one in a single pass on refresh() or once it holds
+# MAX_PENDING names, so an add never shifts the whole main array.
+#
+# Fuzzy matching uses a trigram inverted index, scored by Jaccard similarity
+# of trigram sets (the same idea as pg_trgm). Everything is ranked by usage:
+# how many itinerary stops point at the city. Each worker counts its own new
+# stops as they happen; refresh() reloads the counts from the database,
+# which also brings in the other workers' stops.
+
+LARGE_RANGE = 256          # Prefix ranges this big get a cached top-K
+CACHED_TOP_K = 25
+FUZZY_THRESHOLD = 0.3
+FUZZY_CANDIDATES = 100     # Best trigram-overlap candidates that get scored
+FUZZY_SCAN_BUDGET = 5000   # Posting entries counted per query, rarest trigrams first
+REFRESH_INTERVAL = 30.0    # Seconds between catch-up loads of new cities and usage
+MAX_PENDING = 4096         # Added cities held apart from the main array
+
+def normalize(name: str) -> str:
+    # "São Paulo " -> "sao paulo"
+    decomposed = unicodedata.normalize("NFKD", name.strip().casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass
+class CityEntry:
+    id: int
+    name: str
+    country: str
+    key: str
+    usage: int = 0
+    gram_count: int = 0
+
+@dataclass
+class CityMatch:
+    entry: CityEntry
+    match: str      # "prefix" or "fuzzy"
+    score: float
+
+class CityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.entries: Dict[int, CityEntry] = {}
+        self._keys: List[str] = []       # sorted normalized names
+        self._key_ids: List[int] = []    # city id at the same position
+        self._pending_keys: List[str] = [] # added since the last merge, sorted
+        self._pending_ids: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._top_cache: Dict[str, List[int]] = {}
+        self.max_id = 0
+        self.loaded_at: Optional[float] = None
+
+    # --- LOADING ---
+
+    async def load(self, session: AsyncSession):
+        """Full (re)build from the database. Called at startup."""
+        usage = await self._load_usage(session)
+        cities = (await session.exec(select(City.id, City.name, City.country))).all()
+        with self._lock:
+            self._reset()
+            rows = sorted(
+                (CityEntry(id=c_id, name=name, country=country, key=normalize(name), usage=usage.get(c_id, 0))
+                 for c_id, name, country in cities),
+                key=lambda e: (e.key, e.id)
+            )
+            for entry in rows:
+                self.entries[entry.id] = entry
+                self._keys.append(entry.key)
+                self._key_ids.append(entry.id)
+                self._index_trigrams(entry)
+                self.max_id = max(self.max_id, entry.id)
+            self._warm_top_cache()
+            self.loaded_at = time.monotonic()
+
+    async def refresh(self, session: AsyncSession):
+        """Pick up cities created and stops added since the last load (e.g. by
+        other workers)."""
+        self.loaded_at = time.monotonic() # Claimed: concurrent requests skip it
+        statement = select(City.id, City.name, City.country).where(City.id > self.max_id)
+        cities = (await session.exec(statement)).all()
+        usage = await self._load_usage(session)
+        with self._lock:
+            for c_id, name, country in cities:
+                self.add(c_id, name, country)
+            self._merge_pending()
+            # A record_usage() landing between the query and here is
+            # overwritten by the older count until the next refresh
+            self._apply_usage(usage)
+
+    def needs_refresh(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > REFRESH_INTERVAL
+
+    @staticmethod
+    async def _load_usage(session: AsyncSession) -> Dict[int, int]:
+        statement = select(ItineraryStop.city_id, func.count(ItineraryStop.id)).group_by(ItineraryStop.city_id)
+        return dict((await session.exec(statement)).all())
+
+    # --- INCREMENTAL UPDATES ---
+
+    def add(self, city_id: int, name: str, country: str, usage: int = 0):
+        with self._lock:
+            if city_id in self.entries:
+                return
+            entry = CityEntry(id=city_id, name=name, country=country, key=normalize(name), usage=usage)
+            self.entries[city_id] = entry
+            position = bisect.bisect_right(self._pending_keys, entry.key)
+            self._pending_keys.insert(position, entry.key)
+            self._pending_ids.insert(position, entry.id)
+            self._index_trigrams(entry)
+            self.max_id = max(self.max_id, city_id)
+            self._update_top_cache(entry)
+            if len(self._pending_keys) >= MAX_PENDING:
+                self._merge_pending()
+
+    def _merge_pending(self):
+        if not self._pending_keys:
+            return
+        # One pass: the main array is copied in slices between the pending
+        # names' insert positions
+        keys, ids, start = [], [], 0
+        for key, c_id in zip(self._pending_keys, self._pending_ids):
+            end = bisect.bisect_right(self._keys, key, start)
+            keys += self._keys[start:end]
+            ids += self._key_ids[start:end]
+            keys.append(key)
+            ids.append(c_id)
+            start = end
+        self._keys = keys + self._keys[start:]
+        self._key_ids = ids + self._key_ids[start:]
+        self._pending_keys, self._pending_ids = [], []
+
+    def _apply_usage(self, usage: Dict[int, int]):
+        changed = [
+            (entry, count) for c_id, count in usage.items()
+            if (entry := self.entries.get(c_id)) is not None and entry.usage != count
+        ]
+        # Cities whose last stop is gone
+        changed += [(entry, 0) for entry in self.entries.values() if entry.usage and entry.id not in usage]
+        for entry, count in changed:
+            dropped = count < entry.usage
+            entry.usage = count
+            if dropped:
+                self._rerank_top_cache(entry)
+            else:
+                self._update_top_cache(entry)
+
+    def record_usage(self, cities: Iterable[City]):
+        """Call after committing new itinerary stops for these cities."""
+        with self._lock:
+            for city in cities:
+                entry = self.entries.get(city.id)
+                if entry is None:
+                    self.add(city.id, city.name, city.country)
+                    entry = self.entries[city.id]
+                entry.usage += 1
+                self._update_top_cache(entry)
+
+    def _index_trigrams(self, entry: CityEntry):
+        grams = trigrams(entry.key)
+        entry.gram_count = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(entry.id)
+
+    def _rank_key(self, c_id: int):
+        entry = self.entries[c_id]
+        return (entry.usage, -len(entry.key))
+
+    def _warm_top_cache(self):
+        # Every 1- and 2-character prefix, plus any longer prefix found to be large
+        for length in (1, 2):
+            for prefix in {key[:length] for key in self._keys}:
+                span = self._prefix_ids(prefix)
+                if len(span) >= LARGE_RANGE:
+                    self._top_cache[prefix] = self._rank_by_usage(self._key_ids[span.start:span.stop], CACHED_TOP_K)
+
+    def _update_top_cache(self, entry: CityEntry):
+        # Keep cached top-K lists correct without recomputing whole ranges
+        for length in range(1, len(entry.key) + 1):
+            cached = self._top_cache.get(entry.key[:length])
+            if cached is None:
+                continue
+            if entry.id not in cached:
+                if len(cached) >= CACHED_TOP_K and self._rank_key(cached[-1]) >= self._rank_key(entry.id):
+                    continue
+                cached.append(entry.id)
+            cached.sort(key=self._rank_key, reverse=True)
+            del cached[CACHED_TOP_K:]
+
+    def _rerank_top_cache(self, entry: CityEntry):
+        # Ranked lower: whoever was just outside a cached top-K may now be in it
+        for length in range(1, len(entry.key) + 1):
+            prefix = entry.key[:length]
+            cached = self._top_cache.get(prefix)
+            if cached is not None and entry.id in cached:
+                self._top_cache[prefix] = self._rank_by_usage(self._range_ids(prefix), CACHED_TOP_K)
+
+    # --- QUERIES ---
+
+    @staticmethod
+    def _span(keys: List[str], prefix: str) -> range:
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\uffff")
+        return range(start, end)
+
+    def _prefix_ids(self, prefix: str) -> range:
+        """Positions of the prefix in the main array (pending not included)."""
+        return self._span(self._keys, prefix)
+
+    def _range_ids(self, prefix: str) -> List[int]:
+        span = self._prefix_ids(prefix)
+        pending = self._span(self._pending_keys, prefix)
+        return self._key_ids[span.start:span.stop] + self._pending_ids[pending.start:pending.stop]
+
+    def _rank_by_usage(self, ids: Iterable[int], limit: int) -> List[int]:
+        return heapq.nlargest(limit, ids, key=self._rank_key)
+
+    def prefix(self, prefix: str, limit: int) -> List[int]:
+        if limit <= CACHED_TOP_K:
+            cached = self._top_cache.get(prefix)
+            if cached is not None:
+                return cached[:limit]
+        ids = self._range_ids(prefix)
+        if len(ids) >= LARGE_RANGE and limit <= CACHED_TOP_K:
+            cached = self._rank_by_usage(ids, CACHED_TOP_K)
+            self._top_cache[prefix] = cached
+            return cached[:limit]
+        return self._rank_by_usage(ids, limit)
+
+    def fuzzy(self, key: str, limit: int, exclude=()) -> List[CityMatch]:
+        query_grams = trigrams(key)
+        # Rarest trigrams are the most selective; stop before the scan budget
+        # is spent on the common ones
+        postings = []
+        scanned = 0
+        for posting in sorted((self._postings.get(gram, ()) for gram in query_grams), key=len):
+            if scanned + len(posting) > FUZZY_SCAN_BUDGET:
+                break
+            postings.append(posting)
+            scanned += len(posting)
+        # Counter counts in C; only the best-overlapping candidates get scored.
+        # A Jaccard score >= FUZZY_THRESHOLD needs at least that share of the
+        # query's trigrams in common, which prunes most of the counter cheaply.
+        overlap = Counter(chain.from_iterable(postings))
+        min_shared = max(1, int(FUZZY_THRESHOLD * len(query_grams)))
+        candidates = heapq.nlargest(
+            FUZZY_CANDIDATES + len(exclude),
+            ((c_id, shared) for c_id, shared in overlap.items() if shared >= min_shared),
+            key=lambda item: item[1]
+        )
+
+        matches = []
+        for c_id, shared in candidates:
+            if c_id in exclude:
+                continue
+            entry = self.entries[c_id]
+            score = shared / (len(query_grams) + entry.gram_count - shared)
+            if score >= FUZZY_THRESHOLD:
+                matches.append(CityMatch(entry=entry, match="fuzzy", score=score))
+        return heapq.nlargest(limit, matches, key=lambda m: (m.score, m.entry.usage))
+
+    def search(self, query: str, limit: int = 10) -> List[CityMatch]:
+        key = normalize(query)
+        if not key:
+            return []
+        with self._lock:
+            results = [
+                CityMatch(entry=self.entries[c_id], match="prefix", score=1.0)
+                for c_id in self.prefix(key, limit)
+            ]
+            if len(results) < limit and len(key) >= 3:
+                seen = {m.entry.id for m in results}
+                results += self.fuzzy(key, limit - len(results), exclude=seen)
+            return results
+
+    def __len__(self):
+        return len(self.entries)
+
+# One index per process
+city_index = CityIndex()
@@ -0,0 +1,157 @@
+# app/compression.py
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .static import accepts
+
+# Response compression, negotiated per request: Brotli when the client
+# accepts it, else gzip, else nothing. Bodies under `minimum_size` are sent
+# as they are (framing overhead would eat the savings).
+#
+# Skipped entirely for:
+#   - responses that already carry a Content-Encoding (precompressed statics)
+#   - content types that are compressed already (images, archives, ...)
+#   - 204/206/304 responses
+#   - mounted ASGI apps with `no_compression = True` (the /static mount:
+#     uploads are images)
+# Streaming responses are compressed chunk by chunk, flushing after each one
+# so NDJSON exports keep flowing. Chunks of THREAD_MIN_BYTES or more are
+# compressed in the threadpool (zlib and brotli release the GIL) rather than
+# holding the event loop for tens of milliseconds.
+
+EXCLUDED_CONTENT_TYPES = (
+    "image/", "video/", "audio/", "font/woff",
+    "application/zip", "application/gzip", "application/x-gzip",
+    "application/octet-stream", "text/event-stream",
+)
+SKIPPED_STATUSES = (204, 206, 304)
+THREAD_MIN_BYTES = 256 * 1024
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if accepts(accept_encoding, "br"):
+        return "br"
+    if accepts(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + (self._compressor.flush() if final else self._compressor.flush(zlib.Z_SYNC_FLUSH))
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+async def _compress(compressor, data: bytes, final: bool) -> bytes:
+    if len(data) >= THREAD_MIN_BYTES:
+        return await run_in_threadpool(compressor.compress, data, final)
+    return compressor.compress(data, final)
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def make_compressor(self, encoding: str):
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        responder = _Responder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+class _Responder:
+    """Per-request state: holds back http.response.start until the first body
+    chunk shows whether (and how) the response gets compressed."""
+
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, send: Send, encoding: Optional[str]):
+        self.middleware = middleware
+        self.scope = scope
+        self._send = send
+        self.encoding = encoding
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.compressor = None
+
+    def _eligible(self, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        if message["status"] in SKIPPED_STATUSES or "content-encoding" in headers:
+            return False
+        if headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES):
+            return False
+        # Routing has filled this in by the time the response starts
+        endpoint = self.scope.get("endpoint")
+        return not getattr(endpoint, "no_compression", False)
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            if self._eligible(message):
+                self.start = message
+            else:
+                self.passthrough = True
+                await self._send(message)
+            return
+        if self.passthrough or message_type != "http.response.body":
+            if self.start is not None:
+                # e.g. pathsend: nothing to compress
+                await self._send(self.start)
+                self.start = None
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoding is None or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+
+            self.compressor = self.middleware.make_compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # Same entity, different bytes: no longer a strong match
+                headers["ETag"] = "W/" + etag
+            body = await _compress(self.compressor, body, final=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self._send(start)
+            await self._send({**message, "body": body})
+            return
+
+        await self._send({**message, "body": await _compress(self.compressor, body, final=not more_body)})
@@ -1,6 +1,24 @@
 # app/config.py
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
+# Sync driver URL prefix -> async driver URL prefix
+ASYNC_DRIVERS = {
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+    "mysql+pymysql://": "mysql+aiomysql://",
+    "mysql://": "mysql+aiomysql://",
+}
+
+def to_async_url(database_url: str) -> str:
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if database_url.startswith(prefix):
+            return async_prefix + database_url[len(prefix):]
+    # Already an async driver URL (or one we don't know how to map)
+    return database_url
+
 class Settings(BaseSettings):
     # These variables must exist in your .env file
     database_url: str
@@ -10,6 +28,80 @@ class Settings(BaseSettings):
     google_client_secret: str
     access_token_expire_minutes: int = 30
 
+    # Verified-token / user cache in oauth2.py
+    auth_cache_ttl_seconds: int = 60
+    auth_cache_max_entries: int = 10000
+
+    # Async database path. Derived from database_url when not set
+    # (sqlite -> aiosqlite, postgresql -> asyncpg).
+    async_database_url: Optional[str] = None
+    # asyncpg prepared statement cache. Must stay 0 behind PgBouncer in
+    # transaction mode (e.g. the Supabase :6543 pooler).
+    db_statement_cache_size: int = 0
+
+    # Connection pools (both engines; see database.py). Sizes apply per
+    # engine and per worker process. In-memory SQLite ignores them.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0 # Wait for a free connection before erroring
+    db_pool_recycle_seconds: int = 300 # Replace connections older than this (-1: never)
+    db_pool_pre_ping: bool = True # Test each connection on checkout; off trusts recycle alone
+
+    # Development: keep each request's SQL and log repeated statement shapes
+    # (N+1 patterns, see query_inspector.py). Costs memory per request.
+    query_inspection: bool = False
+
+    # Slow-query log (see slow_queries.py): off unless a threshold is set.
+    # ANALYZE rate: fraction of slow Postgres SELECTs whose plan is captured
+    # with EXPLAIN ANALYZE (re-runs the query) instead of plain EXPLAIN.
+    slow_query_ms: Optional[float] = None
+    slow_query_analyze_rate: float = 0.0
+    slow_query_plan_interval_seconds: float = 300.0 # Recapture a shape's plan at most this often
+
+    # Request profiling (see profiling.py): "X-Profile: <internal_token>"
+    # profiles one request; a sample rate > 0 profiles that fraction of all.
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 5.0
+    profile_keep: int = 50 # Profiles kept in memory for GET /internal/profiles
+    profile_max_concurrent: int = 2 # Each one runs a sampler thread
+
+    # GET /internal/* and /metrics. Without a token only loopback clients
+    # may call them; with one, X-Internal-Token (or a Bearer token) must match.
+    internal_token: Optional[str] = None
+
+    # Password hashing (see passwords.py)
+    bcrypt_rounds: int = 12
+    password_hash_executor: str = "process" # "process" or "thread"
+    password_hash_workers: int = 2
+    password_hash_queue_size: int = 32 # Waiting operations allowed before 503
+
+    # Public trip feed (see feed.py)
+    # Only "local" ships today: one cache per worker, so a write seen by one
+    # worker reaches the others' cached pages after feed_cache_ttl_seconds
+    feed_cache_backend: str = "local"
+    feed_cache_ttl_seconds: int = 30
+    feed_cache_max_entries: int = 1000
+    feed_view_flush_seconds: float = 10.0
+
+    # Full-text search (see search.py). Postgres text search configuration;
+    # SQLite always uses FTS5's porter (English) stemmer.
+    search_language: str = "english"
+
+    # Response compression (see compression.py)
+    compression_minimum_size: int = 1024 # Bytes; smaller bodies go out as-is
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4 # 0-11; 4 is the usual sweet spot for dynamic content
+
+    # Avatar uploads (see avatars.py)
+    avatar_max_bytes: int = 5 * 1024 * 1024
+    avatar_variant_sizes: List[int] = [64, 256] # Square thumbnails, in px
+    avatar_variant_workers: int = 1
+    avatar_queue_size: int = 100
+
+    @property
+    def resolved_async_database_url(self) -> str:
+        return self.async_database_url or to_async_url(self.database_url)
+
 
     class Config:
         # Check current directory and parent directory for .env
@@ -1,17 +1,97 @@
-from sqlmodel import create_engine, Session, SQLModel
+from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from .config import settings
+from .passwords import password_service
+from .city_index import city_index
+from .avatars import variant_worker
+from .feed import trip_views
+from .metrics import instrument_engine
+from .migrations import check_schema_version, migrate
+from .pool_metrics import PoolMetrics, async_pool_metrics, instrumented_pool_class, sync_pool_metrics
+from .slow_queries import SlowQueryLog
+
+def _pool_args(url: str, metrics: PoolMetrics) -> dict:
+    args = {"pool_pre_ping": settings.db_pool_pre_ping, "pool_recycle": settings.db_pool_recycle_seconds}
+    pool_class = make_url(url).get_dialect().get_pool_class(make_url(url))
+    if issubclass(pool_class, QueuePool):
+        # Sized pools only (not in-memory SQLite's static/singleton pools)
+        args.update(
+            poolclass=instrumented_pool_class(pool_class, metrics),
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+        )
+    return args
+
+# Sync engine: scripts (reset_db.py, rebuild_rollups.py) and migrations
+engine = create_engine(settings.database_url, **_pool_args(settings.database_url, sync_pool_metrics))
+sync_pool_metrics.attach(engine)
+instrument_engine(engine)
+
+# Async engine: every request handler goes through this one
+def _async_connect_args(url: str) -> dict:
+    if url.startswith("postgresql+asyncpg"):
+        return {
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+        }
+    return {}
+
+async_engine = create_async_engine(
+    settings.resolved_async_database_url,
+    connect_args=_async_connect_args(settings.resolved_async_database_url),
+    **_pool_args(settings.resolved_async_database_url, async_pool_metrics),
+)
+async_pool_metrics.attach(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine)
+
+# Opt-in: one log for both engines, findings at GET /internal/slow-queries
+slow_query_log = None
+if settings.slow_query_ms is not None:
+    slow_query_log = SlowQueryLog(
+        settings.slow_query_ms,
+        analyze_rate=settings.slow_query_analyze_rate,
+        plan_interval_seconds=settings.slow_query_plan_interval_seconds,
+    )
+    slow_query_log.attach(engine)
+    slow_query_log.attach(async_engine.sync_engine)
 
-engine = create_engine(settings.database_url, pool_pre_ping=True, pool_recycle=300)
 def create_db_and_table():
-    SQLModel.metadata.create_all(engine)
+    # Scripts bring the schema up to date themselves (see migrations.py)
+    migrate(engine)
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+async def get_async_session():
+    # expire_on_commit=False: attributes stay readable after commit, so handlers
+    # never trigger an implicit (and in async, illegal) lazy refresh
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_table()
-    yield
\ No newline at end of file
+    # Schema changes are migrate.py's job; refuse to serve an outdated schema
+    try:
+        async with async_engine.connect() as conn:
+            await conn.run_sync(check_schema_version)
+    except Exception:
+        # Pooled driver threads would otherwise keep the process alive
+        await async_engine.dispose()
+        raise
+    # Build the city autocomplete index before taking traffic
+    async with AsyncSession(async_engine) as session:
+        await city_index.load(session)
+    await variant_worker.start(async_engine)
+    trip_views.start(async_engine)
+    yield
+    await trip_views.stop()
+    await variant_worker.stop()
+    password_service.shutdown()
+    await async_engine.dispose()
@@ -0,0 +1,49 @@
+# app/etags.py
+from typing import Optional
+
+from fastapi import Response
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .feed import note_trip_change
+from .models import Trip
+
+# Conditional GET for trip reads.
+# Trip.version goes up by one in the same transaction as every write to the
+# trip's stops or activities (bump_trip_version BEFORE committing, like the
+# rollups). The ETag is derived from (trip id, version), so answering
+# If-None-Match takes one primary-key lookup and never touches stops or
+# activities. ETags are weak: the compression middleware changes the bytes,
+# not the meaning.
+
+CACHE_CONTROL = "private, no-cache" # Clients may keep it, but must revalidate
+
+async def bump_trip_version(session: AsyncSession, trip_id: int):
+    # Atomic increment: concurrent writers each get their own bump
+    statement = update(Trip).where(Trip.id == trip_id).values(version=Trip.version + 1)
+    if session.bind.dialect.update_returning:
+        is_public = (await session.exec(statement.returning(Trip.is_public))).scalar()
+    else:
+        await session.exec(statement)
+        is_public = (await session.exec(select(Trip.is_public).where(Trip.id == trip_id))).first()
+    # Public trips also drop the cached feed pages once this commits
+    note_trip_change(session, bool(is_public))
+
+def trip_etag(trip_id: int, version: int, view: str = "trip") -> str:
+    return f'W/"{view}-{trip_id}-v{version}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 13.1.2): W/ prefixes don't count
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
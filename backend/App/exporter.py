@@ -0,0 +1,125 @@
+# app/exporter.py
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from enum import Enum
+from typing import AsyncIterator
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import async_engine
+from .models import Activity, City, ItineraryStop, Trip
+
+# Streaming export of a user's trips, stops and activities.
+# One ordered outer-join query is read through a server-side cursor
+# (yield_per), and output is flushed in ~64KB pieces, so memory stays flat
+# whatever the account size.
+#
+# NDJSON: a {"type": "trip"} line, then its {"type": "stop"} lines each
+# followed by their {"type": "activity"} lines.
+# CSV: one denormalized row per activity (or per empty stop / empty trip).
+
+YIELD_PER = 1000
+FLUSH_BYTES = 64 * 1024
+
+TRIP_COLUMNS = {
+    "trip_id": Trip.id,
+    "trip_title": Trip.title,
+    "trip_description": Trip.description,
+    "destination": Trip.destination_cache,
+    "trip_start_date": Trip.start_date,
+    "trip_end_date": Trip.end_date,
+    "budget_limit": Trip.budget_limit,
+    "travelers": Trip.travelers,
+    "status": Trip.status,
+    "is_public": Trip.is_public,
+    "created_at": Trip.created_at,
+}
+STOP_COLUMNS = {
+    "stop_id": ItineraryStop.id,
+    "city": City.name,
+    "country": City.country,
+    "order_index": ItineraryStop.order_index,
+    "arrival_date": ItineraryStop.arrival_date,
+    "departure_date": ItineraryStop.departure_date,
+}
+ACTIVITY_COLUMNS = {
+    "activity_id": Activity.id,
+    "activity_title": Activity.title,
+    "activity_description": Activity.description,
+    "category": Activity.category,
+    "cost": Activity.cost,
+    "activity_date": Activity.activity_date,
+    "start_time": Activity.start_time,
+    "is_completed": Activity.is_completed,
+}
+CSV_HEADER = list(TRIP_COLUMNS) + list(STOP_COLUMNS) + list(ACTIVITY_COLUMNS)
+
+def _export_statement(owner_id: int):
+    columns = [*TRIP_COLUMNS.values(), *STOP_COLUMNS.values(), *ACTIVITY_COLUMNS.values()]
+    return (
+        select(*columns)
+        .select_from(Trip)
+        .outerjoin(ItineraryStop, ItineraryStop.trip_id == Trip.id)
+        .outerjoin(City, ItineraryStop.city_id == City.id)
+        .outerjoin(Activity, Activity.stop_id == ItineraryStop.id)
+        .where(Trip.owner_id == owner_id)
+        .order_by(Trip.id, ItineraryStop.order_index, ItineraryStop.id, Activity.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+async def _rows(owner_id: int) -> AsyncIterator[list]:
+    """Rows as plain values, in CSV_HEADER order."""
+    # Own session: a streaming body outlives the request's dependencies
+    async with AsyncSession(async_engine) as session:
+        result = await session.stream(_export_statement(owner_id))
+        async for row in result:
+            yield [_plain(value) for value in row]
+
+async def export_ndjson(owner_id: int) -> AsyncIterator[bytes]:
+    buffer = []
+    size = 0
+    trip_id = stop_id = None
+    async for values in _rows(owner_id):
+        record = dict(zip(CSV_HEADER, values))
+        lines = []
+        if record["trip_id"] != trip_id:
+            trip_id, stop_id = record["trip_id"], None
+            lines.append({"type": "trip", **{k: record[k] for k in TRIP_COLUMNS}})
+        if record["stop_id"] is not None and record["stop_id"] != stop_id:
+            stop_id = record["stop_id"]
+            lines.append({"type": "stop", "trip_id": trip_id, **{k: record[k] for k in STOP_COLUMNS}})
+        if record["activity_id"] is not None:
+            lines.append({"type": "activity", "stop_id": stop_id, **{k: record[k] for k in ACTIVITY_COLUMNS}})
+
+        for line in lines:
+            encoded = json.dumps(line) + "\n"
+            buffer.append(encoded)
+            size += len(encoded)
+        if size >= FLUSH_BYTES:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+async def export_csv(owner_id: int) -> AsyncIterator[bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADER)
+    async for values in _rows(owner_id):
+        writer.writerow(values)
+        if out.tell() >= FLUSH_BYTES:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
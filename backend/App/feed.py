@@ -0,0 +1,217 @@
+# app/feed.py
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import bindparam, event, exists, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .cache import TTLCache
+from .cities import city_key
+from .config import settings
+from .models import City, ItineraryStop, Trip
+from .pagination import encode_cursor, encode_rank_cursor, keyset_after, keyset_after_rank
+
+# Public trip feed: GET /trips/public, newest or most viewed, optionally
+# limited to trips with a stop in one city, keyset-paginated.
+#
+# Rendered pages (JSON bytes + next cursor) are kept in a bounded cache, so a
+# burst of anonymous traffic is served without a database connection. On a
+# miss, concurrent requests for the same page wait for ONE build instead of
+# all querying at once. Pages are keyed by a generation number; committing a
+# write to a public trip bumps it (see note_trip_change), which orphans every
+# cached page at once. The TTL bounds staleness for everything else (view
+# counts, other workers' writes).
+#
+# Views are counted in memory and flushed as one batched UPDATE every
+# feed_view_flush_seconds, never one write per view.
+
+logger = logging.getLogger(__name__)
+
+class FeedSort(str, Enum):
+    NEWEST = "newest"
+    MOST_VIEWED = "most_viewed"
+
+@dataclass
+class FeedPage:
+    body: bytes
+    next_cursor: Optional[str]
+
+# --- CACHE ---
+
+class LocalCacheBackend:
+    """In-process backend (one copy per worker). Also what tests use."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(max_entries, ttl)
+
+    async def get(self, key: Hashable):
+        return self._cache.get(key)
+
+    async def set(self, key: Hashable, value):
+        self._cache.set(key, value)
+
+    async def clear(self):
+        self._cache.clear()
+
+def make_cache_backend(name: str):
+    if name == "local":
+        return LocalCacheBackend(settings.feed_cache_max_entries, settings.feed_cache_ttl_seconds)
+    raise ValueError(f"Unknown feed cache backend: {name}")
+
+class FeedCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.generation = 0
+        self._building: Dict[Hashable, asyncio.Future] = {}
+
+    def invalidate(self):
+        # Old keys are never asked for again and age out of the backend
+        self.generation += 1
+
+    async def get_or_build(self, key: Hashable, build: Callable[[], Awaitable[FeedPage]]) -> FeedPage:
+        key = (self.generation, key)
+        page = await self.backend.get(key)
+        if page is not None:
+            return page
+
+        while (pending := self._building.get(key)) is not None:
+            # Same page already being built: share its result (or its error)
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The builder's request went away, not ours: build it again
+                # (the first waiter to get here does, the others wait on it)
+                if pending.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._building[key] = future
+        try:
+            page = await build()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't leave "exception never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(page)
+            # A write committed while we were building: don't cache a stale page
+            if key[0] == self.generation:
+                await self.backend.set(key, page)
+            return page
+        finally:
+            self._building.pop(key, None)
+
+feed_cache = FeedCache(make_cache_backend(settings.feed_cache_backend))
+
+# --- INVALIDATION ---
+
+_CHANGED_KEY = "public_trip_changed"
+
+def note_trip_change(session: AsyncSession, is_public: bool):
+    """Call for writes to a trip; public ones invalidate the feed on commit."""
+    if is_public:
+        session.info[_CHANGED_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    if session.info.pop(_CHANGED_KEY, False):
+        feed_cache.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session):
+    session.info.pop(_CHANGED_KEY, None)
+
+# --- QUERY ---
+
+def public_feed_statement(sort: FeedSort, city: Optional[str], cursor: Optional[str], limit: int):
+    statement = select(Trip).where(Trip.is_public == True)  # noqa: E712
+    if city:
+        statement = statement.where(
+            exists()
+            .where(ItineraryStop.trip_id == Trip.id)
+            .where(ItineraryStop.city_id == City.id)
+            .where(City.name_key == city_key(city))
+        )
+    if sort == FeedSort.MOST_VIEWED:
+        after = keyset_after_rank(Trip.view_count, Trip.id, cursor)
+        statement = statement.order_by(Trip.view_count.desc(), Trip.id.desc())
+    else:
+        after = keyset_after(Trip.created_at, Trip.id, cursor)
+        statement = statement.order_by(Trip.created_at.desc(), Trip.id.desc())
+    if after is not None:
+        statement = statement.where(after)
+    # One extra row tells whether there is a next page
+    return statement.limit(limit + 1)
+
+def next_cursor(sort: FeedSort, trips: List[Trip], limit: int) -> Optional[str]:
+    if len(trips) <= limit:
+        return None
+    last = trips[limit - 1]
+    if sort == FeedSort.MOST_VIEWED:
+        return encode_rank_cursor(last.view_count, last.id)
+    return encode_cursor(last.created_at, last.id)
+
+# --- VIEW COUNTS ---
+
+class ViewCounter:
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+        self._engine: Optional[AsyncEngine] = None
+
+    def record(self, trip_id: int):
+        self._pending[trip_id] += 1
+
+    async def flush(self):
+        if not self._pending or self._engine is None:
+            return
+        pending, self._pending = self._pending, Counter()
+        statement = (
+            update(Trip)
+            .where(Trip.id == bindparam("trip_id"))
+            .values(view_count=Trip.view_count + bindparam("views"))
+        )
+        try:
+            # executemany on a plain connection: one statement for the batch
+            async with self._engine.begin() as conn:
+                await conn.execute(statement, [
+                    {"trip_id": trip_id, "views": views} for trip_id, views in pending.items()
+                ])
+        except Exception:
+            # Put them back; the next flush retries
+            self._pending.update(pending)
+            raise
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing trip view counts failed")
+
+    def start(self, engine: AsyncEngine):
+        self._engine = engine
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+trip_views = ViewCounter(settings.feed_view_flush_seconds)
@@ -0,0 +1,172 @@
+# app/importer.py
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import Activity
+from .rollups import record_activities_bulk
+from .search import activity_document, index_documents, search_backend
+
+# Streaming bulk import of activities (CSV or NDJSON request bodies).
+# The body is consumed chunk by chunk and each row is validated as soon as it
+# is complete. Valid rows go out in executemany batches of CHUNK_SIZE, all in
+# the caller's transaction. Nothing but the current batch and a capped error
+# list is held in memory, whatever the size of the upload.
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+
+class ImportReport(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    errors: list = []
+    errors_truncated: bool = False
+
+    def add_error(self, row: int, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+        else:
+            self.errors_truncated = True
+
+def detect_format(content_type: Optional[str], explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json", ""):
+        return "ndjson"
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send text/csv or application/x-ndjson"
+    )
+
+# --- PARSING ---
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body is not valid UTF-8")
+    if pending:
+        yield pending.rstrip("\r")
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yields (row_number, dict) or (row_number, error message)."""
+    row_number = 0
+    async for line in iter_lines(chunks):
+        row_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, "Each line must be a JSON object"
+            continue
+        yield row_number, row
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yields (row_number, dict) or (row_number, error message). Row 1 is the
+    first data row after the header."""
+    header = None
+    record = ""
+    row_number = 0
+    async for line in iter_lines(chunks):
+        record = f"{record}\n{line}" if record else line
+        # A quoted field may contain newlines: wait until the quotes balance
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells mean "not provided" so optional fields fall back to defaults
+        yield row_number, {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        row_number += 1
+        yield row_number, "Unterminated quoted field"
+
+# --- IMPORT ---
+
+async def import_activities(
+    session: AsyncSession,
+    rows: AsyncIterator[Tuple[int, object]],
+    schema: Type[BaseModel],
+    trip_id: int,
+    resolve_stop: Callable[[dict], object],
+) -> ImportReport:
+    """Validate and insert rows. `resolve_stop(row)` returns the stop id for a
+    row or an error string. The caller owns the transaction and commits."""
+    report = ImportReport()
+    batch = []
+
+    async def flush():
+        if not batch:
+            return
+        if search_backend(session) is not None:
+            # Search documents need the new ids: RETURNING, still one executemany
+            statement = insert(Activity).returning(Activity.id, sort_by_parameter_order=True)
+            ids = (await session.exec(statement, params=batch)).scalars().all()
+            await index_documents(session, [
+                activity_document(activity_id, trip_id, values["title"], values["description"])
+                for activity_id, values in zip(ids, batch)
+            ])
+        else:
+            await session.exec(insert(Activity), params=batch)
+        deltas: Dict[tuple, list] = {}
+        for values in batch:
+            delta = deltas.setdefault((values["stop_id"], values["category"]), [0.0, 0])
+            delta[0] += values["cost"]
+            delta[1] += 1
+        await record_activities_bulk(session, trip_id, deltas)
+        report.imported += len(batch)
+        batch.clear()
+
+    async for row_number, row in rows:
+        if isinstance(row, str):
+            report.add_error(row_number, [row])
+            continue
+
+        stop_id = resolve_stop(row)
+        if isinstance(stop_id, str):
+            report.add_error(row_number, [stop_id])
+            continue
+
+        try:
+            activity = schema(**row)
+        except ValidationError as e:
+            report.add_error(row_number, [
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            ])
+            continue
+
+        batch.append({"stop_id": stop_id, **activity.model_dump()})
+        if len(batch) >= CHUNK_SIZE:
+            await flush()
+
+    await flush()
+    return report
@@ -9,16 +9,29 @@ from starlette.middleware.sessions import SessionMiddleware
 from .routers import google_auth # Import new router
 from .routers import trips # Import trips router
 from .routers import users # Import users router
-
-from fastapi.staticfiles import StaticFiles
+from .routers import cities # Import cities router
+from .routers import internal # Pool metrics
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware
+from .profiling import ProfilingMiddleware
+from .static import UploadFiles
+from .storage import UPLOAD_DIR
 
 app = FastAPI(lifespan=lifespan)
-# Serve Uploads
-app.mount("/static", StaticFiles(directory="App/uploads"), name="static")
+# Serve Uploads (immutable caching for content-hashed names, see static.py)
+app.mount("/static", UploadFiles(directory=UPLOAD_DIR), name="static")
 
 # This encrypts cookies so we can safely store the "state" during the Google dance
 app.add_middleware(SessionMiddleware, secret_key=settings.secret_key)
 
+# gzip / Brotli for JSON payloads (nested trip lists get large)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+)
+
 origins = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
@@ -35,13 +48,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # Keyset pagination cursor for GET /trips/
 )
 
+# Sampling profiler for single requests; not installed unless something can trigger it
+if settings.internal_token or settings.profile_sample_rate > 0:
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=settings.internal_token,
+        sample_rate=settings.profile_sample_rate,
+        interval_ms=settings.profile_interval_ms,
+        max_concurrent=settings.profile_max_concurrent,
+    )
+
+# Added last = outermost: times everything above, compression included
+app.add_middleware(MetricsMiddleware, inspect_queries=settings.query_inspection)
+
 # app.include_router(items.router)
 app.include_router(google_auth.router)
 app.include_router(auth.router) # Plug it in
 app.include_router(trips.router) # Register Trips Router
 app.include_router(users.router) # Register Users Router
+app.include_router(cities.router) # City autocomplete
+app.include_router(internal.router) # Operational endpoints, loopback/token only
+app.include_router(internal.metrics_router) # Prometheus /metrics, same guard
 
 # Expose a simple HTTP Bearer (JWT) security scheme in the OpenAPI docs so
 # the Swagger "Authorize" modal accepts a raw token (Authorization: Bearer <token>).
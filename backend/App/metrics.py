@@ -0,0 +1,235 @@
+# app/metrics.py
+import bisect
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .query_inspector import N_PLUS_ONE_THRESHOLD, QueryLog, record_capture, report_repeated
+
+# Request metrics, served in Prometheus text format by GET /metrics.
+# MetricsMiddleware (outermost) times every HTTP request and labels it with
+# the route TEMPLATE ("/trips/{trip_id}", never the raw path, so label
+# cardinality stays bounded). While a request runs, a RequestStats object
+# sits in a ContextVar; the engine hooks from instrument_engine() add each
+# SQL statement and its time to it. Context is inherited by the tasks,
+# threadpool calls and async-engine greenlets the request starts, so every
+# statement lands on the right request. Statements outside any request
+# (workers, flushers) are counted as background.
+#
+# Per request the cost is a few perf_counter() calls, two bisects and one
+# short lock; rendering happens only when /metrics is scraped. With
+# inspect_queries the statements themselves are kept too, for the N+1
+# report (see query_inspector.py) -- a development setting.
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+UNMATCHED_ROUTE = "unmatched"
+
+class Histogram:
+    """Fixed buckets, Prometheus style: counts are cumulative per upper bound."""
+
+    def __init__(self, buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1) # Last slot: +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """[(upper bound, count <= bound)], ending with ("+Inf", count)."""
+        result, running = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), self._counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": {str(bound): count for bound, count in self.cumulative()},
+        }
+
+# --- PROMETHEUS TEXT FORMAT ---
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def header(name: str, kind: str, help_text: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+def sample(name: str, labels: Dict[str, object], value) -> str:
+    return f"{name}{_labels(labels)} {value}"
+
+def histogram_samples(name: str, labels: Dict[str, object], histogram: Histogram) -> List[str]:
+    lines = [
+        sample(f"{name}_bucket", {**labels, "le": bound}, count)
+        for bound, count in histogram.cumulative()
+    ]
+    lines.append(sample(f"{name}_sum", labels, round(histogram.sum, 6)))
+    lines.append(sample(f"{name}_count", labels, histogram.count))
+    return lines
+
+# --- REQUESTS ---
+
+class RequestStats:
+    __slots__ = ("scope", "statements", "db_seconds", "log")
+
+    def __init__(self, scope: Scope, log: Optional[QueryLog] = None):
+        self.scope = scope # The router fills in scope["route"] once matched
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.log = log
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+def current_route() -> Optional[str]:
+    """Route template of the request running in this context, if any."""
+    stats = _current.get()
+    return route_label(stats.scope) if stats is not None else None
+
+class _RouteMetrics:
+    __slots__ = ("duration", "statements", "db_seconds")
+
+    def __init__(self):
+        self.duration = Histogram()
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.db_seconds = Histogram()
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], _RouteMetrics] = {}
+        self._responses: Counter = Counter() # (method, route, status) -> count
+        self.background_statements = 0
+        self.background_db_seconds = 0.0
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = _RouteMetrics()
+            metrics.duration.observe(seconds)
+            metrics.statements.observe(stats.statements)
+            metrics.db_seconds.observe(stats.db_seconds)
+            self._responses[(method, route, status_code)] += 1
+
+    def observe_statement(self, statement: str, seconds: float):
+        record_capture(statement, seconds)
+        stats = _current.get()
+        if stats is not None:
+            # Only this request's task touches it; no lock needed
+            stats.statements += 1
+            stats.db_seconds += seconds
+            if stats.log is not None:
+                stats.log.add(statement, seconds)
+            return
+        with self._lock:
+            self.background_statements += 1
+            self.background_db_seconds += seconds
+
+    def prometheus_lines(self) -> List[str]:
+        with self._lock:
+            routes = sorted(self._routes.items())
+            responses = sorted(self._responses.items())
+            background = (self.background_statements, self.background_db_seconds)
+
+        lines = header("http_requests_total", "counter", "Responses by route and status code.")
+        for (method, route, status_code), count in responses:
+            lines.append(sample("http_requests_total", {"method": method, "route": route, "status": status_code}, count))
+        for name, attribute, kind, help_text in (
+            ("http_request_duration_seconds", "duration", "histogram", "Request latency by route (until the last body byte)."),
+            ("http_request_db_statements", "statements", "histogram", "SQL statements executed per request."),
+            ("http_request_db_seconds", "db_seconds", "histogram", "Time spent executing SQL per request."),
+        ):
+            lines += header(name, kind, help_text)
+            for (method, route), metrics in routes:
+                lines += histogram_samples(name, {"method": method, "route": route}, getattr(metrics, attribute))
+        lines += header("db_background_statements_total", "counter", "SQL statements executed outside any request.")
+        lines.append(sample("db_background_statements_total", {}, background[0]))
+        lines += header("db_background_seconds_total", "counter", "Time spent executing SQL outside any request.")
+        lines.append(sample("db_background_seconds_total", {}, round(background[1], 6)))
+        return lines
+
+metrics = MetricsRegistry()
+
+def route_label(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("endpoint") is not None and "root_path" in scope:
+        # A Mount (e.g. /static): its prefix, not the file path
+        return scope["root_path"][len(scope.get("app_root_path", "")):] or "/"
+    return UNMATCHED_ROUTE
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry = metrics, inspect_queries: bool = False):
+        self.app = app
+        self.registry = registry
+        self.inspect_queries = inspect_queries
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope, QueryLog() if self.inspect_queries else None)
+        token = _current.set(stats)
+        status_code = 500 # If the app raises before responding
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            route = route_label(scope)
+            self.registry.observe_request(scope["method"], route, status_code, time.perf_counter() - started, stats)
+            if stats.log is not None:
+                report_repeated(scope["method"], route, stats.log, N_PLUS_ONE_THRESHOLD)
+
+# --- ENGINE HOOKS ---
+
+def instrument_engine(engine: Engine, registry: MetricsRegistry = metrics):
+    """Count statements and their time. For an AsyncEngine pass .sync_engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        registry.observe_statement(statement, time.perf_counter() - conn.info["metrics_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(exception_context):
+        conn = exception_context.connection
+        started = conn.info.get("metrics_started") if conn is not None else None
+        if started and exception_context.statement is not None:
+            registry.observe_statement(exception_context.statement, time.perf_counter() - started.pop())
+
+def render(extra: Iterable[str] = ()) -> str:
+    return "\n".join([*metrics.prometheus_lines(), *extra]) + "\n"
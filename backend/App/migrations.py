@@ -0,0 +1,330 @@
+# app/migrations.py
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import (
+    JSON, Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Index, Integer, MetaData, Table, Time,
+    bindparam, inspect, select, text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex, DropIndex
+from sqlmodel import SQLModel
+from sqlmodel.sql.sqltypes import AutoString
+
+from . import models  # noqa: F401 -- registers every table on SQLModel.metadata
+from .cities import city_key
+from .search import create_search_schema, rebuild_search_index_sync
+
+# Versioned schema migrations.
+# The schema is built by the numbered steps below, applied in order by
+# migrate.py (scripts call migrate() through create_db_and_table()). The
+# version reached is kept in the one-row schema_version table. The app itself
+# never changes the schema: on startup check_schema_version() only compares
+# the database's version with the latest step here and refuses to start on
+# a mismatch.
+#
+# Each step runs in its own transaction together with its version bump, so a
+# failed step leaves the database at the previous version. On PostgreSQL an
+# advisory lock makes concurrent migrators (two deploys) queue up.
+#
+# Steps never build tables from the models: a step has to produce the same
+# schema whenever it runs, whatever the models look like by then. Tables are
+# created from the frozen definitions below, columns are added with explicit
+# types and indexes are named (the models must still have them; see
+# _model_indexes). Step 1 is the schema the old create_all-on-boot built at
+# the baseline. Databases it built may also have tables and columns added
+# before migrations existed, so every step must be a no-op when its change
+# is already there: use _add_column, _create_indexes and checkfirst, which
+# check first.
+
+LOCK_KEY = 72_041_019 # Any constant; shared by everyone running migrations
+
+_version_metadata = MetaData()
+schema_version = Table("schema_version", _version_metadata, Column("version", Integer, nullable=False))
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+    downgrade: Optional[Callable[[Connection], None]] = None
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str, downgrade: Optional[Callable[[Connection], None]] = None):
+    def register(upgrade):
+        if version != len(MIGRATIONS) + 1:
+            raise RuntimeError(f"Migration {version} registered out of order")
+        MIGRATIONS.append(Migration(version, description, upgrade, downgrade))
+        return upgrade
+    return register
+
+def latest_version() -> int:
+    return len(MIGRATIONS)
+
+# --- HELPERS ---
+
+def _quote(conn: Connection, name: str) -> str:
+    return conn.dialect.identifier_preparer.quote(name)
+
+def _add_column(conn: Connection, table_name: str, column: Column, default: Optional[str] = None):
+    """ALTER TABLE ... ADD COLUMN, unless it exists.
+    `default` (SQL literal) makes it NOT NULL and fills existing rows."""
+    if column.name in {existing["name"] for existing in inspect(conn).get_columns(table_name)}:
+        return
+    ddl = f"ALTER TABLE {_quote(conn, table_name)} ADD COLUMN {_quote(conn, column.name)} {column.type.compile(conn.dialect)}"
+    if default is not None:
+        ddl += f" NOT NULL DEFAULT {default}"
+    conn.exec_driver_sql(ddl)
+
+def _model_indexes(names):
+    found = {index.name: index for table in SQLModel.metadata.sorted_tables for index in table.indexes if index.name in names}
+    missing = set(names) - set(found)
+    if missing:
+        raise RuntimeError(f"No such index on the models: {', '.join(sorted(missing))}")
+    return [found[name] for name in names]
+
+# IF [NOT] EXISTS rather than checkfirst: the database checks, no reflection
+
+def _create_indexes(conn: Connection, *names: str):
+    for index in _model_indexes(names):
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+def _drop_indexes(conn: Connection, *names: str):
+    for index in _model_indexes(names):
+        conn.execute(DropIndex(index, if_exists=True))
+
+# --- FROZEN TABLES ---
+# As the models declared them when each table was introduced. Never edit
+# these: change the schema with a new step.
+
+_frozen = MetaData()
+# Enum columns store member names (SQLModel's default)
+_trip_status = Enum("PLANNING", "ACTIVE", "COMPLETED", "CANCELLED", name="tripstatus")
+_expense_category = Enum("TRANSPORT", "STAY", "FOOD", "ACTIVITY", "OTHER", name="expensecategory")
+
+# Baseline: what create_all built on boot
+_user = Table(
+    "user", _frozen,
+    Column("id", Integer, primary_key=True),
+    Column("name", AutoString, nullable=False),
+    Column("username", AutoString, nullable=False),
+    Column("email", AutoString, nullable=False),
+    Column("hashed_password", AutoString, nullable=False),
+    Column("avatar_url", AutoString),
+    Column("bio", AutoString),
+    Column("home_city", AutoString),
+    Index("ix_user_username", "username", unique=True),
+    Index("ix_user_email", "email", unique=True),
+)
+_city = Table(
+    "city", _frozen,
+    Column("id", Integer, primary_key=True),
+    Column("name", AutoString, nullable=False),
+    Column("country", AutoString, nullable=False),
+    Column("image_url", AutoString),
+    Column("description", AutoString),
+    Index("ix_city_name", "name"),
+)
+_trip = Table(
+    "trip", _frozen,
+    Column("id", Integer, primary_key=True),
+    Column("title", AutoString, nullable=False),
+    Column("description", AutoString),
+    Column("start_date", Date),
+    Column("end_date", Date),
+    Column("budget_limit", Float, nullable=False),
+    Column("travelers", Integer, nullable=False),
+    Column("status", _trip_status, nullable=False),
+    Column("destination_cache", AutoString),
+    Column("is_public", Boolean, nullable=False),
+    Column("cover_image_url", AutoString),
+    Column("created_at", DateTime, nullable=False),
+    Column("owner_id", Integer, ForeignKey("user.id"), nullable=False),
+)
+_itinerarystop = Table(
+    "itinerarystop", _frozen,
+    Column("id", Integer, primary_key=True),
+    Column("trip_id", Integer, ForeignKey("trip.id"), nullable=False),
+    Column("city_id", Integer, ForeignKey("city.id"), nullable=False),
+    Column("arrival_date", Date),
+    Column("departure_date", Date),
+    Column("order_index", Integer, nullable=False),
+)
+_activity = Table(
+    "activity", _frozen,
+    Column("id", Integer, primary_key=True),
+    Column("stop_id", Integer, ForeignKey("itinerarystop.id"), nullable=False),
+    Column("title", AutoString, nullable=False),
+    Column("description", AutoString),
+    Column("activity_date", Date),
+    Column("start_time", Time),
+    Column("is_completed", Boolean, nullable=False),
+    Column("category", _expense_category, nullable=False),
+    Column("cost", Float, nullable=False),
+)
+
+# Added while the schema still came from create_all
+_tripspend = Table(
+    "tripspend", _frozen,
+    Column("trip_id", Integer, ForeignKey("trip.id"), primary_key=True),
+    Column("total_spent", Float, nullable=False),
+    Column("activity_count", Integer, nullable=False),
+)
+_tripspendbreakdown = Table(
+    "tripspendbreakdown", _frozen,
+    Column("trip_id", Integer, ForeignKey("trip.id"), primary_key=True),
+    Column("stop_id", Integer, ForeignKey("itinerarystop.id"), primary_key=True),
+    Column("category", _expense_category, primary_key=True),
+    Column("amount", Float, nullable=False),
+    Column("activity_count", Integer, nullable=False),
+)
+_storedblob = Table(
+    "storedblob", _frozen,
+    Column("name", AutoString, primary_key=True),
+    Column("ref_count", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+# --- STEPS ---
+
+@migration(1, "Baseline: the tables create_all used to build on boot")
+def _baseline(conn: Connection):
+    # Existing tables are left alone, so this adopts create_all databases
+    _frozen.create_all(conn, tables=[_user, _city, _trip, _itinerarystop, _activity])
+
+@migration(2, "Catch up: rollup and blob tables, avatar variants, trip version/view count, search index, feed indexes")
+def _catch_up(conn: Connection):
+    # Added while the schema still came from create_all, which never altered
+    # existing tables: old databases may have any of it. ix_city_name_key
+    # is step 5, which has to merge duplicates first
+    _frozen.create_all(conn, tables=[_tripspend, _tripspendbreakdown, _storedblob])
+    _add_column(conn, "user", Column("avatar_variants", JSON(none_as_null=True)))
+    _add_column(conn, "trip", Column("version", Integer), "1")
+    _add_column(conn, "trip", Column("view_count", Integer), "0")
+    create_search_schema(conn)
+    _create_indexes(conn, "ix_trip_public_created", "ix_trip_public_views")
+
+HOT_PATH_INDEXES = (
+    "ix_trip_owner_created",       # get_my_trips / export: owner_id = ? ORDER BY created_at, id
+    "ix_itinerarystop_trip_order", # selectinload(Trip.stops): trip_id IN (...) ORDER BY order_index
+    "ix_itinerarystop_city_id",    # stops of a city (feed city filter)
+    "ix_activity_stop_id",         # selectinload(ItineraryStop.activities): stop_id IN (...)
+)
+
+@migration(3, "Hot-path indexes on trip.owner_id, itinerarystop.trip_id/city_id, activity.stop_id",
+           downgrade=lambda conn: _drop_indexes(conn, *HOT_PATH_INDEXES))
+def _hot_path_indexes(conn: Connection):
+    _create_indexes(conn, *HOT_PATH_INDEXES)
+
+def _data_only(conn: Connection):
+    # Reverting a data step: the rows it wrote stay valid at the previous version
+    pass
+
+@migration(4, "Backfill spend rollups for every existing trip", downgrade=_data_only)
+def _backfill_rollups(conn: Connection):
+    # Trips from before the rollups have no rows (and writes to them used to
+    # start a row from their own delta only): recompute everything from the
+    # Activity rows, as rebuild_rollups.py does
+    conn.execute(text("DELETE FROM tripspendbreakdown"))
+    conn.execute(text("DELETE FROM tripspend"))
+    conn.execute(text(
+        "INSERT INTO tripspendbreakdown (trip_id, stop_id, category, amount, activity_count) "
+        "SELECT itinerarystop.trip_id, activity.stop_id, activity.category, SUM(activity.cost), COUNT(activity.id) "
+        "FROM activity JOIN itinerarystop ON activity.stop_id = itinerarystop.id "
+        "GROUP BY itinerarystop.trip_id, activity.stop_id, activity.category"
+    ))
+    conn.execute(text(
+        "INSERT INTO tripspend (trip_id, total_spent, activity_count) "
+        "SELECT trip.id, COALESCE(SUM(activity.cost), 0), COUNT(activity.id) FROM trip "
+        "LEFT JOIN itinerarystop ON itinerarystop.trip_id = trip.id "
+        "LEFT JOIN activity ON activity.stop_id = itinerarystop.id "
+        "GROUP BY trip.id"
+    ))
+
+@migration(5, "Add city.name_key; merge case-duplicate cities; unique index on it",
+           downgrade=lambda conn: _drop_indexes(conn, "ix_city_name_key"))
+def _unique_city_names(conn: Connection):
+    # Before cities.py, "Paris" and "paris" could become two rows. Keys come
+    # from city_key(), as the resolver's lookups do (SQL lower() only folds
+    # ASCII on SQLite). The oldest row of each group is kept and the others'
+    # stops are moved onto it (itinerarystop.city_id is the only reference to
+    # city); merging is not undone on downgrade, and the column stays
+    _add_column(conn, "city", Column("name_key", AutoString), "''")
+    city = SQLModel.metadata.tables["city"]
+    stop = SQLModel.metadata.tables["itinerarystop"]
+    kept = {}
+    for city_id, name in conn.execute(select(city.c.id, city.c.name).order_by(city.c.id)):
+        keeper = kept.setdefault(city_key(name), city_id)
+        if keeper != city_id:
+            conn.execute(stop.update().where(stop.c.city_id == city_id).values(city_id=keeper))
+            conn.execute(city.delete().where(city.c.id == city_id))
+    if kept:
+        conn.execute(
+            city.update().where(city.c.id == bindparam("keeper_id")).values(name_key=bindparam("key")),
+            [{"keeper_id": city_id, "key": key} for key, city_id in kept.items()],
+        )
+    _create_indexes(conn, "ix_city_name_key")
+
+@migration(6, "Backfill the search index for existing trips, stops and activities", downgrade=_data_only)
+def _backfill_search(conn: Connection):
+    # Documents are only written with the rows, so rows from before the
+    # search index have none: rebuild the whole table, as rebuild_search.py
+    # does. A no-op where there is no search backend
+    rebuild_search_index_sync(conn)
+
+# --- RUNNER ---
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+def _set_version(conn: Connection, version: int):
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+def migrate(engine: Engine, target: Optional[int] = None, log: Callable[[str], None] = print) -> int:
+    """Upgrade (or downgrade) to `target`, default the latest. One
+    transaction per step. Returns the version reached."""
+    target = latest_version() if target is None else target
+    if not 0 <= target <= latest_version():
+        raise ValueError(f"No migration {target}; latest is {latest_version()}")
+
+    while True:
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                # Released at commit; a second migrator then sees the new version
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+            schema_version.create(conn, checkfirst=True)
+            version = current_version(conn)
+            if version == target:
+                return version
+            if version < target:
+                step = MIGRATIONS[version]
+                step.upgrade(conn)
+                reached = step.version
+            else:
+                step = MIGRATIONS[version - 1]
+                if step.downgrade is None:
+                    raise RuntimeError(f"Migration {step.version} cannot be reverted")
+                step.downgrade(conn)
+                reached = version - 1
+            _set_version(conn, reached)
+        log(f"{'Applied' if reached > version else 'Reverted'} {step.version}: {step.description}")
+
+def check_schema_version(conn: Connection):
+    """Startup check (conn.run_sync): the database must be at latest_version()."""
+    version = current_version(conn)
+    if version != latest_version():
+        raise RuntimeError(
+            f"Database schema is at version {version}, this code needs {latest_version()}. "
+            "Run `python migrate.py` first."
+        )
+
+def drop_schema(conn: Connection):
+    """Everything migrate() creates (reset_db.py)."""
+    # Goes first: on PostgreSQL it references trip
+    conn.exec_driver_sql("DROP TABLE IF EXISTS search_document")
+    SQLModel.metadata.drop_all(conn)
+    schema_version.drop(conn, checkfirst=True)
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import JSON, Column, Index
 from typing import Optional, List
 from datetime import date, time, datetime
 from enum import Enum
@@ -28,6 +29,8 @@ class User(SQLModel, table=True):
     
     # Profile Fields
     avatar_url: Optional[str] = None
+    # Thumbnail URLs by size, filled in by the background worker (see avatars.py)
+    avatar_variants: Optional[dict] = Field(default=None, sa_column=Column(JSON(none_as_null=True)))
     bio: Optional[str] = None
     home_city: Optional[str] = None
     
@@ -38,6 +41,7 @@ class User(SQLModel, table=True):
 class City(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
+    name_key: str # cities.city_key(name): lookups and uniqueness
     country: str
     image_url: Optional[str] = None
     description: Optional[str] = None
@@ -45,6 +49,9 @@ class City(SQLModel, table=True):
     # Relationships
     stops: List["ItineraryStop"] = Relationship(back_populates="city")
 
+# Case-insensitive lookups and conflict-safe get-or-create (see cities.py)
+Index("ix_city_name_key", City.name_key, unique=True)
+
 # --- TRIPS ---
 class Trip(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -59,20 +66,32 @@ class Trip(SQLModel, table=True):
     is_public: bool = False
     cover_image_url: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = 1 # Bumped by every stop/activity write; the ETag (see etags.py)
+    view_count: int = 0 # Public views, flushed in batches (see feed.py)
     
     # Foreign Key
     owner_id: int = Field(foreign_key="user.id")
     
     # Relationships
     owner: User = Relationship(back_populates="trips")
-    stops: List["ItineraryStop"] = Relationship(back_populates="trip")
+    # Itinerary order; read off ix_itinerarystop_trip_order by selectinload
+    stops: List["ItineraryStop"] = Relationship(
+        back_populates="trip",
+        sa_relationship_kwargs={"order_by": "[ItineraryStop.order_index, ItineraryStop.id]"}
+    )
+
+# "My trips", newest first (get_my_trips, export): one index range scan
+Index("ix_trip_owner_created", Trip.owner_id, Trip.created_at, Trip.id)
+# Public feed orderings (see feed.py): one index range scan per page
+Index("ix_trip_public_created", Trip.is_public, Trip.created_at, Trip.id)
+Index("ix_trip_public_views", Trip.is_public, Trip.view_count, Trip.id)
 
 class ItineraryStop(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     
     # Foreign Keys
-    trip_id: int = Field(foreign_key="trip.id")
-    city_id: int = Field(foreign_key="city.id")
+    trip_id: int = Field(foreign_key="trip.id") # Indexed by ix_itinerarystop_trip_order
+    city_id: int = Field(foreign_key="city.id", index=True)
     
     arrival_date: Optional[date] = None
     departure_date: Optional[date] = None
@@ -83,10 +102,13 @@ class ItineraryStop(SQLModel, table=True):
     city: City = Relationship(back_populates="stops")
     activities: List["Activity"] = Relationship(back_populates="stop")
 
+# Stops of a trip, in order. Also serves every trip_id lookup on its own.
+Index("ix_itinerarystop_trip_order", ItineraryStop.trip_id, ItineraryStop.order_index)
+
 class Activity(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     
-    stop_id: int = Field(foreign_key="itinerarystop.id")
+    stop_id: int = Field(foreign_key="itinerarystop.id", index=True)
     
     title: str
     description: Optional[str] = None
@@ -99,4 +121,27 @@ class Activity(SQLModel, table=True):
     cost: float = 0.0
     
     # Relationships
-    stop: ItineraryStop = Relationship(back_populates="activities")
\ No newline at end of file
+    stop: ItineraryStop = Relationship(back_populates="activities")
+
+# --- SPEND ROLLUPS ---
+# Denormalized spend totals, maintained in the same transaction as Activity
+# writes (see rollups.py) so totals and stats are single-row reads.
+class TripSpend(SQLModel, table=True):
+    trip_id: int = Field(foreign_key="trip.id", primary_key=True)
+    total_spent: float = 0.0
+    activity_count: int = 0
+
+class TripSpendBreakdown(SQLModel, table=True):
+    trip_id: int = Field(foreign_key="trip.id", primary_key=True)
+    stop_id: int = Field(foreign_key="itinerarystop.id", primary_key=True)
+    category: ExpenseCategory = Field(primary_key=True)
+    amount: float = 0.0
+    activity_count: int = 0
+
+# --- UPLOAD STORAGE ---
+# One row per content-addressed file in App/uploads (see storage.py).
+# ref_count = how many User.avatar_url / Trip.cover_image_url values point at it.
+class StoredBlob(SQLModel, table=True):
+    name: str = Field(primary_key=True) # "<sha256 hex><ext>"
+    ref_count: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,9 +1,12 @@
 # app/oauth2.py
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlmodel import Session
-from .database import get_session
+from pydantic import BaseModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .cache import TTLCache
+from .database import get_async_session
 from .models import User
 from .config import settings
 
@@ -11,32 +14,65 @@ from .config import settings
 # tokenUrl="login" tells Swagger UI where to send the username/password to get a token.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
-    credentials_exception = HTTPException(
+# Verified token -> Principal. Never outlives the token's own "exp".
+_principal_cache = TTLCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+# user_id -> column values of the User row. Dropped by invalidate_user().
+_user_cache = TTLCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+
+class Principal(BaseModel):
+    """The authenticated caller, as far as the token says. No database involved."""
+    id: int
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    principal = _principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     try:
         # 1. DECODE THE TOKEN
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        
+
         # 2. EXTRACT ID
         # "user_id" must match what we put in create_access_token
         user_id: int = payload.get("user_id")
-        
+
         if user_id is None:
-            raise credentials_exception
-            
+            raise _credentials_exception()
+
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+
+    principal = Principal(id=user_id)
+    ttl = settings.auth_cache_ttl_seconds
+    if payload.get("exp") is not None:
+        ttl = min(ttl, payload["exp"] - time.time())
+    _principal_cache.set(token, principal, ttl=ttl)
+    return principal
 
-    # 3. FETCH USER FROM DB
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session)
+):
+    # 3. FETCH USER FROM DB (or the short-lived cache)
     # We check if the user actually still exists (maybe they were deleted 5 mins ago)
-    user = session.get(User, user_id)
-    
-    if user is None:
-        raise credentials_exception
-        
-    return user
\ No newline at end of file
+    data = _user_cache.get(principal.id)
+    if data is None:
+        user = await session.get(User, principal.id)
+        if user is None:
+            raise _credentials_exception()
+        data = user.model_dump()
+        _user_cache.set(principal.id, data)
+
+    # A fresh, session-less object per request so handlers can't mutate the cache
+    return User(**data)
+
+def invalidate_user(user_id: int):
+    """Call after committing any change to a User row."""
+    _user_cache.pop(user_id)
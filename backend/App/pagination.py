@@ -0,0 +1,74 @@
+# app/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+# Keyset ("cursor") pagination over (created_at, id), or (rank, id) for lists
+# ordered by a counter such as view_count, or (score, id) for search results.
+# The cursor is the sort key of the LAST row of the previous page, so the next
+# page is simply "everything strictly older than that row". Unlike OFFSET this
+# stays one index range scan no matter how deep the client pages.
+
+def _encode(values: list) -> str:
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode(cursor: str, parse) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        first, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return parse(first), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return _encode([created_at.isoformat(), row_id])
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    return _decode(cursor, datetime.fromisoformat)
+
+def encode_rank_cursor(rank: int, row_id: int) -> str:
+    return _encode([rank, row_id])
+
+def decode_rank_cursor(cursor: str) -> Tuple[int, int]:
+    return _decode(cursor, int)
+
+def encode_score_cursor(score: float, row_id: int) -> str:
+    # JSON keeps the float's exact repr, so equality on the next page holds
+    return _encode([score, row_id])
+
+def decode_score_cursor(cursor: str) -> Tuple[float, int]:
+    return _decode(cursor, float)
+
+def _after(first_col, id_col, first, row_id):
+    # Expanded form of (first, id) < (:first, :id) -- row values are
+    # not supported by every backend we run on.
+    return or_(
+        first_col < first,
+        and_(first_col == first, id_col < row_id)
+    )
+
+def keyset_after(created_at_col, id_col, cursor: Optional[str]):
+    """WHERE clause for rows after `cursor` in (created_at DESC, id DESC) order."""
+    if not cursor:
+        return None
+    return _after(created_at_col, id_col, *decode_cursor(cursor))
+
+def keyset_after_rank(rank_col, id_col, cursor: Optional[str]):
+    """WHERE clause for rows after `cursor` in (rank DESC, id DESC) order."""
+    if not cursor:
+        return None
+    return _after(rank_col, id_col, *decode_rank_cursor(cursor))
+
+def keyset_after_score(score_col, id_col, cursor: Optional[str]):
+    """WHERE clause for rows after `cursor` in (score DESC, id DESC) order."""
+    if not cursor:
+        return None
+    return _after(score_col, id_col, *decode_score_cursor(cursor))
@@ -0,0 +1,95 @@
+# app/passwords.py
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .config import settings
+
+# bcrypt off the event loop.
+# Hashing costs hundreds of milliseconds of CPU, so it runs in a small worker
+# pool. At most `workers + queue_size` operations may be in flight; beyond that
+# callers get a 503 right away instead of queueing behind a login storm.
+
+def make_crypt_context(rounds: int) -> CryptContext:
+    # min/max pinned to `rounds` so hashes made with any other cost are
+    # flagged by needs_update() and get re-hashed on the next login
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+# --- WORKER FUNCTIONS (run inside the pool, must stay top-level/picklable) ---
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return make_crypt_context(rounds)
+
+def _hash_worker(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+def _verify_worker(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    try:
+        return _context(rounds).verify_and_update(password, hashed_password)
+    except ValueError:
+        # Not a hash we know (e.g. Google accounts' placeholder): never matches
+        return False, None
+
+class PasswordService:
+    def __init__(self, workers: int, queue_size: int, rounds: int, executor: str = "process"):
+        self.workers = workers
+        self.max_in_flight = workers + queue_size
+        self.rounds = rounds
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing the app never forks worker processes
+        if self._executor is None:
+            if self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _run(self, fn, *args):
+        # Only ever touched from the event loop thread, so no lock is needed
+        if self._in_flight >= self.max_in_flight:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password service is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash_worker, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash). new_hash is set when the stored hash was made
+        with other cost parameters and should replace it."""
+        return await self._run(_verify_worker, password, hashed_password, self.rounds)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_service = PasswordService(
+    workers=settings.password_hash_workers,
+    queue_size=settings.password_hash_queue_size,
+    rounds=settings.bcrypt_rounds,
+    executor=settings.password_hash_executor,
+)
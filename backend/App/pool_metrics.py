@@ -0,0 +1,159 @@
+# app/pool_metrics.py
+import threading
+import time
+from typing import Dict, List, Optional, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+
+from .metrics import Histogram, header, histogram_samples, sample
+
+# Connection pool instrumentation, served by GET /internal/pool (JSON) and
+# as part of GET /metrics (Prometheus).
+# Counters come from pool events (connect, checkout, checkin, invalidate).
+# Two things events cannot see are measured around the pool instead:
+#   - checkout latency: pools built from instrumented_pool_class() time every
+#     Pool.connect() -- waiting for a free slot, opening a new connection and
+#     the pre-ping included. This is what a request feels when the threadpool
+#     and the pool contend; timeouts are counted separately.
+#   - connect latency: do_connect stamps the connection record, the pool's
+#     "connect" event reads the stamp back.
+# Hold time (checkout -> checkin) shows who keeps connections too long.
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.engine: Optional[Engine] = None
+        self._lock = threading.Lock() # The sync engine is used from worker threads
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.checkout_seconds = Histogram()
+        self.connect_seconds = Histogram()
+        self.hold_seconds = Histogram()
+
+    def observe_checkout(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkout_seconds.observe(seconds)
+
+    def attach(self, engine: Engine):
+        """Listen to the engine's pool events. For an AsyncEngine pass .sync_engine."""
+        self.engine = engine
+
+        @event.listens_for(engine, "do_connect")
+        def _connect_started(dialect, connection_record, cargs, cparams):
+            connection_record.info["connect_started"] = time.perf_counter()
+
+        @event.listens_for(engine, "connect")
+        def _connected(dbapi_connection, connection_record):
+            started = connection_record.info.pop("connect_started", None)
+            with self._lock:
+                self.connects += 1
+                if started is not None:
+                    self.connect_seconds.observe(time.perf_counter() - started)
+
+        @event.listens_for(engine, "checkout")
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            connection_record.info["checked_out_at"] = time.perf_counter()
+            with self._lock:
+                self.checkouts += 1
+
+        @event.listens_for(engine, "checkin")
+        def _checkin(dbapi_connection, connection_record):
+            started = connection_record.info.pop("checked_out_at", None)
+            with self._lock:
+                self.checkins += 1
+                if started is not None:
+                    self.hold_seconds.observe(time.perf_counter() - started)
+
+        @event.listens_for(engine, "invalidate")
+        def _invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        # engine.dispose() swaps in a new pool; read the live one
+        pool = self.engine.pool if self.engine is not None else None
+        state = {"pool": type(pool).__name__ if pool is not None else None}
+        if isinstance(pool, QueuePool):
+            state.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                timeout=pool.timeout(),
+            )
+        with self._lock:
+            state.update(
+                checkouts=self.checkouts,
+                checkins=self.checkins,
+                in_use=self.checkouts - self.checkins,
+                connects=self.connects,
+                invalidations=self.invalidations,
+                timeouts=self.timeouts,
+                checkout_seconds=self.checkout_seconds.snapshot(),
+                connect_seconds=self.connect_seconds.snapshot(),
+                hold_seconds=self.hold_seconds.snapshot(),
+            )
+        return state
+
+PROMETHEUS_GAUGES = (
+    ("db_pool_size", "size", "Configured pool size."),
+    ("db_pool_checked_out", "checked_out", "Connections currently checked out."),
+    ("db_pool_checked_in", "checked_in", "Idle connections in the pool."),
+    ("db_pool_overflow", "overflow", "Connections beyond pool_size (negative: unopened slots)."),
+)
+PROMETHEUS_COUNTERS = (
+    ("db_pool_checkouts_total", "checkouts", "Connections handed out."),
+    ("db_pool_connects_total", "connects", "New DBAPI connections opened."),
+    ("db_pool_invalidations_total", "invalidations", "Connections invalidated (failed pre-ping, errors)."),
+    ("db_pool_timeouts_total", "timeouts", "Checkouts that gave up after pool_timeout."),
+)
+PROMETHEUS_HISTOGRAMS = (
+    ("db_pool_checkout_seconds", "checkout_seconds", "Time to get a connection: queue wait, connect and pre-ping."),
+    ("db_pool_connect_seconds", "connect_seconds", "Time to open a new DBAPI connection."),
+    ("db_pool_hold_seconds", "hold_seconds", "Time between checkout and checkin."),
+)
+
+def pool_prometheus_lines() -> List[str]:
+    snapshots = {name: metrics.snapshot() for name, metrics in POOL_METRICS.items()}
+    lines = []
+    for name, key, help_text in PROMETHEUS_GAUGES + PROMETHEUS_COUNTERS:
+        lines += header(name, "counter" if name.endswith("_total") else "gauge", help_text)
+        lines += [sample(name, {"engine": engine}, state[key]) for engine, state in snapshots.items() if key in state]
+    for name, key, help_text in PROMETHEUS_HISTOGRAMS:
+        lines += header(name, "histogram", help_text)
+        for engine, metrics in POOL_METRICS.items():
+            with metrics._lock:
+                lines += histogram_samples(name, {"engine": engine}, getattr(metrics, key))
+    return lines
+
+def instrumented_pool_class(base: Type[Pool], metrics: PoolMetrics) -> Type[Pool]:
+    """Subclass of `base` timing every checkout into `metrics`. A subclass
+    (not a patched instance) so the pool engine.dispose() recreates keeps it."""
+
+    class InstrumentedPool(base):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                connection = super().connect()
+            except exc.TimeoutError:
+                metrics.observe_checkout(time.perf_counter() - started, timed_out=True)
+                raise
+            metrics.observe_checkout(time.perf_counter() - started)
+            return connection
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    InstrumentedPool.__qualname__ = InstrumentedPool.__name__
+    return InstrumentedPool
+
+# One per engine in database.py
+sync_pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
+POOL_METRICS: Dict[str, PoolMetrics] = {metrics.name: metrics for metrics in (sync_pool_metrics, async_pool_metrics)}
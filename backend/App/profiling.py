@@ -0,0 +1,239 @@
+# app/profiling.py
+import asyncio
+import hmac
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+
+import greenlet # Installed with SQLAlchemy's asyncio support
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import route_label
+
+# On-demand request profiling. ProfilingMiddleware profiles a request when
+#   - it carries "X-Profile: <INTERNAL_TOKEN>" (no token configured: never), or
+#   - PROFILE_SAMPLE_RATE picks it at random.
+# Untriggered requests pay one header scan and one random(); with neither
+# trigger configured main.py does not install the middleware at all.
+#
+# A profiled request gets a sampler thread that wakes every
+# PROFILE_INTERVAL_MS and records where the request's asyncio task is:
+#   - running on the event loop: the loop thread's live stack. ORM code
+#     runs inside SQLAlchemy's greenlet, whose stack stops at the greenlet;
+#     the loop greenlet's suspended stack (down to greenlet_spawn) is
+#     stitched in front of it.
+#   - waiting (DB round trip, bcrypt in its executor, threadpool): the
+#     chain of awaits it is suspended in. Wall time, not just CPU time --
+#     what a slow request actually spends. "loop busy" samples are ones
+#     where the request was ready but another task held the event loop.
+# Each sample is also put in one bucket (serialization, orm, bcrypt, other)
+# by its innermost recognised frame. Profiles are kept in memory
+# (PROFILE_KEEP), listed at GET /internal/profiles, and served as folded
+# stacks ("frame;frame;frame count") that flamegraph.pl, inferno and
+# speedscope read directly. The response carries X-Profile-Id.
+
+PROFILE_HEADER = b"x-profile"
+
+# Innermost matching frame decides; checked in this order per frame
+CATEGORIES = (
+    ("bcrypt", ("/bcrypt/", "/App/passwords.py")),
+    ("orm", ("/sqlalchemy/", "/sqlmodel/", "/aiosqlite/", "/asyncpg/", "/psycopg2/")),
+    ("serialization", ("/pydantic/", "/pydantic_core/", "/fastapi/encoders.py", "/json/", "/App/serializers.py")),
+)
+_FUNCTION_CATEGORIES = {"serialize_response": "serialization", "model_dump": "serialization"}
+
+_labels: Dict[object, tuple] = {} # code object -> (label, category)
+
+def _describe(code) -> tuple:
+    described = _labels.get(code)
+    if described is None:
+        path = code.co_filename.replace("\\", "/")
+        category = _FUNCTION_CATEGORIES.get(code.co_name)
+        if category is None:
+            category = next((name for name, parts in CATEGORIES if any(part in path for part in parts)), None)
+        # site-packages/x/y.py -> x/y.py; App/x.py stays App/x.py
+        for marker in ("/site-packages/", "/backend/"):
+            if marker in path:
+                path = path.split(marker, 1)[1]
+                break
+        else:
+            path = path.rsplit("/", 2)[-1] if "/lib/python" not in path else path.split("/lib/", 1)[1]
+        described = _labels[code] = (f"{path}:{code.co_qualname}", category)
+    return described
+
+def _await_chain(coroutine) -> list:
+    """Frames of a suspended task's coroutines, outermost first."""
+    frames = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            break # A Future, or a finished/C-level awaitable
+        frames.append(frame)
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None)
+    return frames
+
+def _live_stack(frame) -> list:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+class RequestProfile:
+    _ids = itertools.count(1)
+
+    def __init__(self, method: str, path: str, interval: float):
+        self.id = f"{int(time.time())}-{next(self._ids)}"
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter() # folded stack -> samples
+        self.categories: Counter = Counter() # category -> samples
+
+    def summary(self) -> dict:
+        per_sample = self.duration / self.samples if self.samples else 0.0
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.samples,
+            "interval_ms": round(self.interval * 1000, 3),
+            "categories_ms": {
+                category: round(count * per_sample * 1000, 3) for category, count in self.categories.most_common()
+            },
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class _Sampler(threading.Thread):
+    def __init__(self, profile: RequestProfile, task: asyncio.Task, middleware_frame):
+        super().__init__(name=f"profiler-{profile.id}", daemon=True)
+        self.profile = profile
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = threading.get_ident() # Started from the loop thread
+        self.loop_greenlet = greenlet.getcurrent()
+        self.middleware_frame = middleware_frame
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.profile.interval):
+            self.sample()
+
+    def sample(self):
+        current = asyncio.current_task(self.loop)
+        if current is self.task:
+            state = "running"
+            frames = _live_stack(sys._current_frames().get(self.thread_id))
+            suspended = self.loop_greenlet.gr_frame
+            if suspended is not None:
+                # In a child greenlet (async ORM): the coroutines above it
+                frames = _live_stack(suspended) + frames
+        else:
+            state = "waiting" if current is None else "waiting (loop busy)"
+            frames = _await_chain(self.task.get_coro())
+
+        # Drop the server and middleware plumbing above this middleware
+        for index, frame in enumerate(frames):
+            if frame is self.middleware_frame:
+                frames = frames[index + 1:]
+                break
+
+        labels, category = [state], "other"
+        for frame in frames:
+            label, frame_category = _describe(frame.f_code)
+            labels.append(label)
+            if frame_category is not None:
+                category = frame_category # Innermost wins
+        self.profile.samples += 1
+        self.profile.stacks[";".join(labels)] += 1
+        self.profile.categories[category] += 1
+
+class ProfileStore:
+    def __init__(self, keep: int = 50):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def summaries(self) -> List[dict]:
+        """Newest first."""
+        with self._lock:
+            profiles = list(self._profiles)
+        return [profile.summary() for profile in reversed(profiles)]
+
+profiles = ProfileStore(settings.profile_keep)
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        interval_ms: float = 5.0,
+        max_concurrent: int = 2,
+        store: ProfileStore = profiles,
+    ):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.store = store
+        self._slots = threading.BoundedSemaphore(max_concurrent) # Each profile costs a thread
+
+    def _triggered(self, scope: Scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._triggered(scope) or not self._slots.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], self.interval)
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        sampler = _Sampler(profile, asyncio.current_task(), sys._getframe())
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stopped.set()
+            profile.duration = time.perf_counter() - started
+            profile.route = route_label(scope)
+            self._slots.release()
+            # Join off the loop; the sampler finishes its current sample at most
+            await asyncio.to_thread(sampler.join)
+            self.store.add(profile)
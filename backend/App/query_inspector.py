@@ -0,0 +1,113 @@
+# app/query_inspector.py
+import logging
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+# N+1 detection and query budgets.
+# Statements are reduced to a fingerprint: literals, bind placeholders and
+# IN/VALUES lists collapse to "?", so "SELECT ... WHERE id = 7" and "... = 8"
+# (or IN lists of any length) have the same shape. A request that runs one
+# shape N_PLUS_ONE_THRESHOLD times or more is usually a loop issuing
+# one query per row: with settings.query_inspection on, MetricsMiddleware
+# keeps a QueryLog per request and logs every such shape with its route.
+#
+# For tests, query_budget() / assert_query_budget() capture EVERY statement
+# run while they are active (any thread, any engine), so they also work with
+# TestClient, which runs the app in its own thread:
+#
+#     with query_budget(5, max_repeats=1):
+#         client.get(f"/trips/{trip_id}", headers=auth)
+#
+#     assert_query_budget(client, "GET", "/trips/", max_statements=6, headers=auth)
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 3
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LIST = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+def fingerprint(statement: str) -> str:
+    """Statement shape: literals and parameters as ?, lists as (?...)."""
+    shape = _STRING.sub("?", statement)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _LIST.sub("(?...)", shape)
+    shape = _REPEATED_LIST.sub("(?...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+class QueryLog:
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = [] # (statement, seconds)
+        self._lock = threading.Lock()
+
+    def add(self, statement: str, seconds: float):
+        with self._lock:
+            self.statements.append((statement, seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def shapes(self) -> Counter:
+        return Counter(fingerprint(statement) for statement, _ in self.statements)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Shapes run `threshold` times or more, most frequent first."""
+        return [(shape, count) for shape, count in self.shapes().most_common() if count >= threshold]
+
+    def describe(self) -> str:
+        return "\n".join(f"  {count}x {shape}" for shape, count in self.shapes().most_common())
+
+def report_repeated(method: str, route: str, log: QueryLog, threshold: int):
+    for shape, count in log.repeated(threshold):
+        logger.warning("Possible N+1 in %s %s: %d x %s", method, route, count, shape)
+
+# --- TEST CAPTURES ---
+
+_captures: List[QueryLog] = []
+_captures_lock = threading.Lock()
+
+def record_capture(statement: str, seconds: float):
+    """Called for every statement (see metrics.instrument_engine)."""
+    if _captures:
+        with _captures_lock:
+            for log in _captures:
+                log.add(statement, seconds)
+
+@contextmanager
+def capture_queries() -> Iterator[QueryLog]:
+    log = QueryLog()
+    with _captures_lock:
+        _captures.append(log)
+    try:
+        yield log
+    finally:
+        with _captures_lock:
+            _captures.remove(log)
+
+@contextmanager
+def query_budget(max_statements: int, max_repeats: Optional[int] = None) -> Iterator[QueryLog]:
+    """Fail (AssertionError) if the block runs more than `max_statements`
+    statements, or any one shape more than `max_repeats` times."""
+    with capture_queries() as log:
+        yield log
+    if log.count > max_statements:
+        raise AssertionError(f"{log.count} SQL statements, budget is {max_statements}:\n{log.describe()}")
+    if max_repeats is not None:
+        repeated = log.repeated(max_repeats + 1)
+        if repeated:
+            shape, count = repeated[0]
+            raise AssertionError(f"Statement ran {count} times, at most {max_repeats} allowed (N+1?): {shape}")
+
+def assert_query_budget(client, method: str, url: str, max_statements: int, max_repeats: Optional[int] = None, **kwargs):
+    """One request through a TestClient within a query budget. Returns the response."""
+    with query_budget(max_statements, max_repeats):
+        return client.request(method, url, **kwargs)
@@ -0,0 +1,267 @@
+# app/rollups.py
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import aggregates
+from .models import Activity, City, ExpenseCategory, ItineraryStop, Trip, TripSpend, TripSpendBreakdown
+
+# Incrementally maintained spend rollups.
+# TripSpend holds one row per trip, TripSpendBreakdown one row per
+# (trip, stop, category). Every Activity write calls one of the record_*
+# helpers BEFORE committing, so the rollups move in the same transaction as
+# the rows they summarize. rebuild_rollups.py recomputes them from raw
+# Activity rows and reports drift.
+#
+# A trip without a TripSpend row (created before the rollups, or restored
+# from an old backup) is seeded from its Activity rows on its first write,
+# never started from that write's delta alone: a partial row would hide the
+# rest of the trip's spend from the read path, which only falls back to live
+# aggregation when the row is missing.
+
+DRIFT_TOLERANCE = 1e-6
+
+# --- WRITE PATH ---
+
+async def _bump_trip(session: AsyncSession, trip_id: int, amount: float, count: int) -> bool:
+    """False when the trip has no TripSpend row yet."""
+    # UPDATE ... SET x = x + :delta so concurrent writers never lose an increment
+    result = await session.exec(
+        update(TripSpend)
+        .where(TripSpend.trip_id == trip_id)
+        .values(
+            total_spent=TripSpend.total_spent + amount,
+            activity_count=TripSpend.activity_count + count
+        )
+    )
+    return result.rowcount > 0
+
+async def _seed_trip(session: AsyncSession, trip_id: int) -> bool:
+    """Create a trip's missing rollup rows from its Activity rows. True when
+    this transaction created them; they then already include the write being
+    recorded, so the caller must not add its delta on top."""
+    await session.flush() # The write being recorded belongs in the GROUP BY
+    raw = await _raw_breakdown(session, trip_id)
+    try:
+        async with session.begin_nested():
+            # Orphaned breakdown rows would be stale too
+            await session.exec(delete(TripSpendBreakdown).where(TripSpendBreakdown.trip_id == trip_id))
+            session.add(TripSpend(
+                trip_id=trip_id,
+                total_spent=sum(amount for amount, _ in raw.values()),
+                activity_count=sum(count for _, count in raw.values())
+            ))
+            session.add_all(
+                TripSpendBreakdown(trip_id=trip_id, stop_id=stop_id, category=category, amount=amount, activity_count=count)
+                for (_, stop_id, category), (amount, count) in raw.items()
+            )
+    except IntegrityError:
+        # A concurrent writer seeded it first, without our uncommitted row
+        return False
+    return True
+
+async def _bump_breakdown(session: AsyncSession, trip_id: int, stop_id: int, category: ExpenseCategory, amount: float, count: int):
+    result = await session.exec(
+        update(TripSpendBreakdown)
+        .where(
+            TripSpendBreakdown.trip_id == trip_id,
+            TripSpendBreakdown.stop_id == stop_id,
+            TripSpendBreakdown.category == category
+        )
+        .values(
+            amount=TripSpendBreakdown.amount + amount,
+            activity_count=TripSpendBreakdown.activity_count + count
+        )
+    )
+    if result.rowcount == 0:
+        await _insert_or_retry(
+            session,
+            TripSpendBreakdown(trip_id=trip_id, stop_id=stop_id, category=category, amount=amount, activity_count=count),
+            lambda: _bump_breakdown(session, trip_id, stop_id, category, amount, count)
+        )
+
+async def _insert_or_retry(session: AsyncSession, row, retry):
+    # Someone else may insert the same key between our UPDATE and INSERT.
+    # The savepoint keeps the outer transaction usable if that happens.
+    try:
+        async with session.begin_nested():
+            session.add(row)
+    except IntegrityError:
+        await retry()
+
+async def _record(session: AsyncSession, trip_id: int, deltas: Dict[tuple, tuple]):
+    """Apply `deltas`, (stop_id, category) -> (amount, count), to the trip's rollups."""
+    total_amount = sum(amount for amount, _ in deltas.values())
+    total_count = sum(count for _, count in deltas.values())
+    if not await _bump_trip(session, trip_id, total_amount, total_count):
+        if await _seed_trip(session, trip_id):
+            return
+        await _bump_trip(session, trip_id, total_amount, total_count)
+    for (stop_id, category), (amount, count) in deltas.items():
+        await _bump_breakdown(session, trip_id, stop_id, category or ExpenseCategory.OTHER, amount, count)
+
+def _add_delta(deltas: Dict[tuple, tuple], stop_id: int, category: Optional[ExpenseCategory], amount: float, count: int):
+    key = (stop_id, category or ExpenseCategory.OTHER)
+    old_amount, old_count = deltas.get(key, (0.0, 0))
+    deltas[key] = (old_amount + amount, old_count + count)
+    return deltas
+
+def init_trip_rollup(session: AsyncSession, trip_id: int):
+    """Create the (empty) TripSpend row for a brand new trip."""
+    session.add(TripSpend(trip_id=trip_id))
+
+async def record_activity_added(session: AsyncSession, activity: Activity, trip_id: int):
+    await _record(session, trip_id, _add_delta({}, activity.stop_id, activity.category, activity.cost, +1))
+
+async def record_activities_bulk(session: AsyncSession, trip_id: int, deltas: Dict[tuple, list]):
+    """Bulk inserts: `deltas` maps (stop_id, category) -> (amount, count)."""
+    merged = {}
+    for (stop_id, category), (amount, count) in deltas.items():
+        _add_delta(merged, stop_id, category, amount, count)
+    await _record(session, trip_id, merged)
+
+# --- READ PATH ---
+
+async def rollup_totals(session: AsyncSession, trip_ids: Iterable[int]) -> Dict[int, float]:
+    """total_spent per trip. Trips that have no rollup row yet (created before
+    the rollups existed and not yet backfilled) fall back to live aggregation."""
+    trip_ids = list(trip_ids)
+    if not trip_ids:
+        return {}
+    rows = (await session.exec(
+        select(TripSpend.trip_id, TripSpend.total_spent).where(TripSpend.trip_id.in_(trip_ids))
+    )).all()
+    totals = dict(rows)
+    missing = [trip_id for trip_id in trip_ids if trip_id not in totals]
+    if missing:
+        totals.update(await aggregates.trip_totals(session, missing))
+    return totals
+
+async def rollup_total(session: AsyncSession, trip_id: int) -> float:
+    return (await rollup_totals(session, [trip_id])).get(trip_id, 0.0)
+
+async def rollup_stats(session: AsyncSession, trip: Trip) -> dict:
+    """Payload for GET /trips/{trip_id}/stats, read from the rollup tables."""
+    spend = await session.get(TripSpend, trip.id)
+    if spend is None:
+        return await aggregates.trip_stats(session, trip)
+
+    category_rows = (await session.exec(
+        select(TripSpendBreakdown.category, func.sum(TripSpendBreakdown.amount))
+        .where(TripSpendBreakdown.trip_id == trip.id, TripSpendBreakdown.activity_count > 0)
+        .group_by(TripSpendBreakdown.category)
+    )).all()
+    city_rows = (await session.exec(
+        select(City.name, func.coalesce(func.sum(TripSpendBreakdown.amount), 0.0))
+        .select_from(ItineraryStop)
+        .join(City, ItineraryStop.city_id == City.id)
+        .outerjoin(TripSpendBreakdown, TripSpendBreakdown.stop_id == ItineraryStop.id)
+        .where(ItineraryStop.trip_id == trip.id)
+        .group_by(ItineraryStop.id, City.name)
+        .order_by(ItineraryStop.id)
+    )).all()
+
+    total_budget = trip.budget_limit
+    return {
+        "total_budget": total_budget,
+        "total_spent": spend.total_spent,
+        "remaining_budget": total_budget - spend.total_spent,
+        "category_breakdown": {category.value: amount for category, amount in category_rows},
+        "city_breakdown": [{"city": name, "amount": amount} for name, amount in city_rows]
+    }
+
+# --- REBUILD / VERIFY ---
+
+async def _raw_breakdown(session: AsyncSession, trip_id: Optional[int] = None):
+    """{(trip_id, stop_id, category): (amount, count)} straight from Activity rows."""
+    statement = (
+        select(
+            ItineraryStop.trip_id,
+            Activity.stop_id,
+            Activity.category,
+            func.sum(Activity.cost),
+            func.count(Activity.id)
+        )
+        .join(ItineraryStop, Activity.stop_id == ItineraryStop.id)
+        .group_by(ItineraryStop.trip_id, Activity.stop_id, Activity.category)
+    )
+    if trip_id is not None:
+        statement = statement.where(ItineraryStop.trip_id == trip_id)
+    return {
+        (t_id, stop_id, category): (amount or 0.0, count)
+        for t_id, stop_id, category, amount, count in (await session.exec(statement)).all()
+    }
+
+async def _stored_breakdown(session: AsyncSession, trip_id: Optional[int] = None):
+    statement = select(TripSpendBreakdown)
+    if trip_id is not None:
+        statement = statement.where(TripSpendBreakdown.trip_id == trip_id)
+    return {
+        (row.trip_id, row.stop_id, row.category): (row.amount, row.activity_count)
+        for row in (await session.exec(statement)).all()
+    }
+
+async def find_drift(session: AsyncSession, trip_id: Optional[int] = None) -> List[dict]:
+    """Compare the rollup tables with raw Activity rows. Empty list == in sync."""
+    drift = []
+
+    raw = await _raw_breakdown(session, trip_id)
+    stored = await _stored_breakdown(session, trip_id)
+    for key in sorted(set(raw) | set(stored), key=lambda k: (k[0], k[1], k[2].value)):
+        expected = raw.get(key, (0.0, 0))
+        actual = stored.get(key, (0.0, 0))
+        if abs(expected[0] - actual[0]) > DRIFT_TOLERANCE or expected[1] != actual[1]:
+            t_id, stop_id, category = key
+            drift.append({
+                "trip_id": t_id,
+                "stop_id": stop_id,
+                "category": category.value,
+                "expected": expected[0],
+                "actual": actual[0]
+            })
+
+    trip_statement = select(Trip.id)
+    if trip_id is not None:
+        trip_statement = trip_statement.where(Trip.id == trip_id)
+    trip_ids = (await session.exec(trip_statement)).all()
+    expected_totals = await aggregates.trip_totals(session, trip_ids)
+    stored_totals = dict((await session.exec(
+        select(TripSpend.trip_id, TripSpend.total_spent).where(TripSpend.trip_id.in_(trip_ids))
+    )).all())
+    for t_id in trip_ids:
+        expected = expected_totals.get(t_id, 0.0)
+        actual = stored_totals.get(t_id)
+        if actual is None or abs(expected - actual) > DRIFT_TOLERANCE:
+            drift.append({
+                "trip_id": t_id,
+                "stop_id": None,
+                "category": None,
+                "expected": expected,
+                "actual": actual
+            })
+    return drift
+
+async def rebuild_rollups(session: AsyncSession, trip_id: Optional[int] = None):
+    """Recompute the rollups from raw Activity rows. Caller commits."""
+    trip_delete = delete(TripSpend)
+    breakdown_delete = delete(TripSpendBreakdown)
+    trip_statement = select(Trip.id)
+    if trip_id is not None:
+        trip_delete = trip_delete.where(TripSpend.trip_id == trip_id)
+        breakdown_delete = breakdown_delete.where(TripSpendBreakdown.trip_id == trip_id)
+        trip_statement = trip_statement.where(Trip.id == trip_id)
+    await session.exec(breakdown_delete)
+    await session.exec(trip_delete)
+
+    raw = await _raw_breakdown(session, trip_id)
+    trip_rows = {t_id: TripSpend(trip_id=t_id) for t_id in (await session.exec(trip_statement)).all()}
+    for (t_id, stop_id, category), (amount, count) in raw.items():
+        session.add(TripSpendBreakdown(
+            trip_id=t_id, stop_id=stop_id, category=category, amount=amount, activity_count=count
+        ))
+        trip_rows[t_id].total_spent += amount
+        trip_rows[t_id].activity_count += count
+    session.add_all(trip_rows.values())
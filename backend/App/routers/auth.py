@@ -2,22 +2,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
 from fastapi.security import OAuth2PasswordRequestForm 
 from typing import Optional
-import shutil
-from pathlib import Path
-import uuid
 
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
-from ..database import get_session
+from ..avatars import save_avatar, variant_worker
+from ..database import get_async_session
 from ..models import User
-from ..utils import hash_password, verify_password, create_access_token
+from ..oauth2 import invalidate_user
+from ..passwords import password_service
+from ..storage import retain
+from ..utils import create_access_token
 
 router = APIRouter(tags=["authentication"])
 
-# Define path for uploads
-UPLOAD_DIR = Path("App/uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -31,33 +29,24 @@ async def register_user(
     bio: Optional[str] = Form(None),
     home_city: Optional[str] = Form(None),
     avatar_file: Optional[UploadFile] = File(None),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     
     statement = select(User).where(
         (User.username == username) | (User.email == email)
     )
-    existing_user = session.exec(statement).first()
+    existing_user = (await session.exec(statement)).first()
     
     if existing_user:
         raise HTTPException(status_code=400, detail="Username or Email already taken")
     
-    hashed_pwd = hash_password(password)
+    # bcrypt is CPU-bound; it runs in the password worker pool
+    hashed_pwd = await password_service.hash(password)
     
-    # Handle Avatar Upload
+    # Handle Avatar Upload (streamed to disk, size-capped; served under /static)
     avatar_url = None
     if avatar_file:
-        # Create unique filename
-        file_extension = Path(avatar_file.filename).suffix
-        filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = UPLOAD_DIR / filename
-        
-        # Save file
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(avatar_file.file, buffer)
-            
-        # Set URL (assuming mounted at /static)
-        avatar_url = f"/static/{filename}"
+        avatar_url = await save_avatar(avatar_file)
 
     new_user = User(
         name=name,
@@ -70,8 +59,11 @@ async def register_user(
     )
     
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await retain(session, avatar_url)
+    await session.commit()
+    await session.refresh(new_user)
+    if avatar_url:
+        variant_worker.enqueue(new_user.id, avatar_url)
     
     return {"message": "User created successfully", "user_id": new_user.id}
 
@@ -81,6 +73,7 @@ class UserPublic(BaseModel):
     username: str
     email: str
     avatar_url: Optional[str] = None
+    avatar_variants: Optional[dict] = None
     bio: Optional[str] = None
     home_city: Optional[str] = None
 
@@ -90,20 +83,34 @@ class LoginResponse(BaseModel):
     user: UserPublic
 
 @router.post("/login", response_model=LoginResponse)
-def login_user(
+async def login_user(
     user_credentials: OAuth2PasswordRequestForm = Depends(), 
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     # Search by EMAIL instead of username
     statement = select(User).where(User.email == user_credentials.username)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
 
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
             detail="Invalid Credentials"
         )
 
+    valid, new_hash = await password_service.verify(user_credentials.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, 
+            detail="Invalid Credentials"
+        )
+
+    # Stored hash used old cost parameters: transparently upgrade it
+    if new_hash:
+        user.hashed_password = new_hash
+        session.add(user)
+        await session.commit()
+        invalidate_user(user.id)
+
     access_token = create_access_token(data={"user_id": user.id})
 
     return {
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List
+from pydantic import BaseModel
+
+from ..city_index import city_index
+from ..database import get_async_session
+
+router = APIRouter(prefix="/cities", tags=["Cities"])
+
+class CitySuggestion(BaseModel):
+    id: int
+    name: str
+    country: str
+    usage: int
+    match: str # "prefix" or "fuzzy"
+    score: float
+
+@router.get("/search", response_model=List[CitySuggestion])
+async def search_cities(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(get_async_session)
+):
+    # Served from the in-process index; the DB is only touched to pick up
+    # cities and usage from other workers since the last catch-up
+    if city_index.needs_refresh():
+        await city_index.refresh(session)
+
+    return [
+        CitySuggestion(
+            id=m.entry.id,
+            name=m.entry.name,
+            country=m.entry.country,
+            usage=m.entry.usage,
+            match=m.match,
+            score=round(m.score, 3)
+        )
+        for m in city_index.search(q, limit)
+    ]
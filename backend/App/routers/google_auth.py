@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Request, Depends, HTTPException
 from authlib.integrations.starlette_client import OAuth
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..config import settings
-from ..database import get_session
+from ..database import get_async_session
 from ..models import User
 from ..utils import create_access_token
 import secrets # To generate random passwords for Google users
@@ -28,7 +29,7 @@ async def google_login(request: Request):
 
 # 3. CALLBACK ROUTE (Google comes back here)
 @router.get("/callback", name="google_auth")
-async def google_auth(request: Request, session: Session = Depends(get_session)):
+async def google_auth(request: Request, session: AsyncSession = Depends(get_async_session)):
     try:
         token = await oauth.google.authorize_access_token(request)
     except Exception as e:
@@ -48,7 +49,7 @@ async def google_auth(request: Request, session: Session = Depends(get_session))
     
     # A. Check if user exists
     statement = select(User).where(User.email == email)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     
     if not user:
         # B. Create New User
@@ -65,8 +66,8 @@ async def google_auth(request: Request, session: Session = Depends(get_session))
             avatar_url=picture
         )
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
 
     # C. Generate OUR Token (The same JWT we used for password login)
     access_token = create_access_token(data={"user_id": user.id})
@@ -0,0 +1,70 @@
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+
+from .. import database
+from ..config import settings
+from ..metrics import render
+from ..pool_metrics import POOL_METRICS, pool_prometheus_lines
+from ..profiling import profiles
+
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+def require_internal(request: Request):
+    # Operational data, not for the public internet. Behind a reverse proxy
+    # every client looks like loopback: set INTERNAL_TOKEN there.
+    if settings.internal_token:
+        # Header, or a bearer token (what Prometheus scrape configs send)
+        supplied = request.headers.get("x-internal-token") or request.headers.get("authorization", "").removeprefix("Bearer ")
+        if hmac.compare_digest(supplied.encode(), settings.internal_token.encode()):
+            return
+    elif request.client is not None and request.client.host in LOOPBACK_HOSTS:
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal endpoint")
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    include_in_schema=False,
+    dependencies=[Depends(require_internal)],
+)
+
+@router.get("/pool")
+async def pool_metrics():
+    # Live pool state plus counters/histograms since startup (see pool_metrics.py)
+    return {name: metrics.snapshot() for name, metrics in POOL_METRICS.items()}
+
+@router.get("/slow-queries")
+async def slow_queries(reset: bool = False):
+    # Slow statements grouped by fingerprint, with plans (see slow_queries.py)
+    if database.slow_query_log is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Slow-query log is off (set SLOW_QUERY_MS)")
+    findings = database.slow_query_log.snapshot()
+    if reset:
+        database.slow_query_log.reset()
+    return {"threshold_ms": settings.slow_query_ms, "queries": findings}
+
+@router.get("/profiles")
+async def list_profiles():
+    # Profiled requests, newest first (see profiling.py)
+    return profiles.summaries()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|folded)$")):
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "folded":
+        # Collapsed stacks for flamegraph.pl / inferno / speedscope
+        return Response(profile.folded(), media_type="text/plain; charset=utf-8")
+    return {**profile.summary(), "stacks": dict(profile.stacks.most_common())}
+
+# Prometheus scrapes /metrics by default, so this one lives at the root
+metrics_router = APIRouter(include_in_schema=False, dependencies=[Depends(require_internal)])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@metrics_router.get("/metrics")
+async def prometheus_metrics():
+    # Request latency/status/SQL per route (see metrics.py) plus pool state
+    return Response(render(pool_prometheus_lines()), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,20 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional, Union
 from datetime import date, time, datetime 
+from enum import Enum
 from sqlalchemy.orm import selectinload
 
-from ..database import get_session
-from ..models import Trip, City, ItineraryStop, Activity, User, ExpenseCategory, TripStatus
-from ..oauth2 import get_current_user
+from ..rollups import init_trip_rollup, record_activity_added, rollup_totals, rollup_total, rollup_stats
+from ..cities import city_key, resolve_cities
+from ..city_index import city_index
+from ..config import settings
+from ..database import async_engine, get_async_session
+from ..etags import bump_trip_version, cache_headers, etag_matches, not_modified, trip_etag
+from ..exporter import export_csv, export_ndjson
+from ..feed import FeedPage, FeedSort, feed_cache, next_cursor, note_trip_change, public_feed_statement, trip_views
+from ..importer import ImportReport, detect_format, import_activities, iter_csv_rows, iter_ndjson_rows
+from ..models import Trip, City, ItineraryStop, Activity, ExpenseCategory, TripStatus
+from ..oauth2 import Principal, get_current_principal
+from ..pagination import encode_cursor, encode_score_cursor, keyset_after
+from ..search import activity_document, index_documents, search_statement, stop_document, trip_document
+from ..serializers import JSONBytesResponse, TripSerializer
 
 router = APIRouter(prefix="/trips", tags=["Trips"])
 
 # --- Pydantic Models for Requests/Responses ---
-from pydantic import BaseModel
-
-# --- Pydantic Models for Requests/Responses ---
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class cityRead(BaseModel):
     id: int
@@ -40,7 +51,7 @@ class StopRead(BaseModel):
     order_index: int
     activities: List[ActivityRead] = []
 
-class TripRead(BaseModel):
+class TripBase(BaseModel):
     id: int
     title: str
     description: Optional[str] = None
@@ -54,9 +65,41 @@ class TripRead(BaseModel):
     is_public: bool = False
     created_at: datetime
     owner_id: int
+
+class TripRead(TripBase):
     stops: List[StopRead] = []
     total_spent: Optional[float] = 0.0
 
+class TripSummaryRead(TripBase):
+    # Trip columns only -- no stop/activity payloads.
+    # extra="forbid" keeps full TripRead payloads from matching this schema
+    # when the list endpoint's response_model picks between the two views.
+    model_config = ConfigDict(extra="forbid")
+
+    total_spent: Optional[float] = 0.0
+
+class PublicTripRead(TripSummaryRead):
+    view_count: int = 0
+
+class TripSearchResult(TripSummaryRead):
+    score: float
+
+class TripListView(str, Enum):
+    FULL = "full"
+    SUMMARY = "summary"
+
+# TripRead / TripSummaryRead rendered straight from ORM rows (see serializers.py).
+# Field lists come from the schemas, which still document the responses.
+trip_serializer = TripSerializer(
+    trip_fields=[name for name in TripBase.model_fields],
+    stop_fields=[name for name in StopRead.model_fields if name not in ("city", "activities")],
+    city_fields=list(cityRead.model_fields),
+    activity_fields=list(ActivityRead.model_fields),
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 class TripCreateSchema(BaseModel):
     destination: str
     start_date: date
@@ -65,6 +108,12 @@ class TripCreateSchema(BaseModel):
     budget: float = 0.0
     stops: List[str] = []
 
+class TripUpdate(BaseModel):
+    # Only the fields sent are changed
+    title: Optional[str] = None
+    description: Optional[str] = None
+    is_public: Optional[bool] = None
+
 class StopCreate(BaseModel):
     city_id: Optional[int] = None
     city_name: Optional[str] = None
@@ -83,10 +132,10 @@ class ActivityCreate(BaseModel):
 # --- ENDPOINTS ---
 
 @router.post("/", response_model=Trip)
-def create_trip(
+async def create_trip(
     trip_data: TripCreateSchema, 
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
 ):
     # Auto-generate Title
     generated_title = f"Trip to {trip_data.destination}"
@@ -102,83 +151,191 @@ def create_trip(
         # Default status is PLANNING via Model
     )
     
+    # Everything below happens in ONE transaction
     session.add(new_trip)
-    session.commit()
-    session.refresh(new_trip)
+    await session.flush() # Assigns new_trip.id
+    init_trip_rollup(session, new_trip.id)
 
     # Process Stops
-    for index, city_name in enumerate(trip_data.stops):
-        # 1. Get or Create City
-        # Check case-insensitive existence if possible, but safe simple match for now
-        city = session.exec(select(City).where(City.name == city_name)).first()
-        if not city:
-            city = City(name=city_name, country="Unknown") # Default country
-            session.add(city)
-            session.commit()
-            session.refresh(city)
-        
-        # 2. Create Stop
-        new_stop = ItineraryStop(
+    # 1. Get or Create all Cities at once (case-insensitive)
+    cities = await resolve_cities(session, trip_data.stops)
+
+    # 2. Create Stops
+    new_stops = [
+        ItineraryStop(
             trip_id=new_trip.id,
-            city_id=city.id,
+            city_id=cities[city_key(city_name)].id,
             order_index=index
         )
-        session.add(new_stop)
+        for index, city_name in enumerate(trip_data.stops)
+        if city_key(city_name)
+    ]
+    session.add_all(new_stops)
+
+    # 3. Search documents, in the same transaction
+    await session.flush() # Assigns the stop ids
+    cities_by_id = {city.id: city for city in cities.values()}
+    await index_documents(session, [trip_document(new_trip)] + [
+        stop_document(stop.id, new_trip.id, cities_by_id[stop.city_id]) for stop in new_stops
+    ])
     
-    session.commit()
-    session.refresh(new_trip)
+    await session.commit()
+    # Only now that the cities are committed may autocomplete see them
+    city_index.record_usage(cities[city_key(name)] for name in trip_data.stops if city_key(name))
+    await session.refresh(new_trip)
     return new_trip
 
-@router.get("/", response_model=List[TripRead])
-def get_my_trips(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+@router.get("/", response_model=Union[List[TripSummaryRead], List[TripRead]], response_class=JSONBytesResponse)
+async def get_my_trips(
+    view: TripListView = TripListView.FULL,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    # Eager load stops, cities, and activities for the list view as well (optional but good for consistency)
-    statement = select(Trip).where(Trip.owner_id == current_user.id).options(
-        selectinload(Trip.stops).selectinload(ItineraryStop.city),
-        selectinload(Trip.stops).selectinload(ItineraryStop.activities)
+    # Newest first, keyset-paginated on (created_at, id).
+    # Without limit/cursor the whole list is returned, as before.
+    statement = select(Trip).where(Trip.owner_id == current_user.id).order_by(
+        Trip.created_at.desc(), Trip.id.desc()
     )
-    trips = session.exec(statement).all()
-    
-    # Calculate total_spent for each trip
-    # This might be expensive for lists, but requested for TripRead
-    trip_reads = []
+    after = keyset_after(Trip.created_at, Trip.id, cursor)
+    if after is not None:
+        statement = statement.where(after)
+
+    page_size = limit or (DEFAULT_PAGE_SIZE if cursor else None)
+    if page_size:
+        # Fetch one extra row to know whether there is a next page
+        statement = statement.limit(page_size + 1)
+
+    if view == TripListView.FULL:
+        # Eager load stops, cities, and activities for the list view as well (optional but good for consistency)
+        statement = statement.options(
+            selectinload(Trip.stops).selectinload(ItineraryStop.city),
+            selectinload(Trip.stops).selectinload(ItineraryStop.activities)
+        )
+    trips = (await session.exec(statement)).all()
+
+    headers = {}
+    if page_size and len(trips) > page_size:
+        trips = trips[:page_size]
+        last = trips[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+
+    # Read totals from the spend rollup instead of summing activities in Python
+    totals = await rollup_totals(session, [trip.id for trip in trips])
+
+    # One pass from ORM rows to JSON bytes; returning a Response skips the
+    # response_model validation (the model still documents the shape)
+    body = trip_serializer.render_many(trips, totals, summary=view == TripListView.SUMMARY)
+    return JSONBytesResponse(body, headers=headers)
+
+async def _build_public_page(sort: FeedSort, city: Optional[str], cursor: Optional[str], limit: int) -> FeedPage:
+    # Own session: cache hits must not check out a connection at all
+    async with AsyncSession(async_engine) as session:
+        trips = (await session.exec(public_feed_statement(sort, city, cursor, limit))).all()
+        cursor_out = next_cursor(sort, trips, limit)
+        trips = trips[:limit]
+        totals = await rollup_totals(session, [trip.id for trip in trips])
+    items = []
     for trip in trips:
-        total = sum(act.cost for stop in trip.stops for act in stop.activities)
-        # Convert to Pydantic model and patch total_spent
-        # Or let Pydantic construct it if we pass a dict-like or just assign attribute if it was a dynamic object
-        # Since SQLModel objects are not dicts, we can use TripRead.from_orm(trip) but adding total_spent is tricky
-        # Easiest: Construct TripRead manually or extend result
-        
-        # Simple hack: Attach property if valid, or construct Pydantic obj
-        # Because we need to map internal structure, automatic mapping is best. 
-        # But total_spent is not on SQLModel. 
-        # We can construct the dict.
-        trip_dict = trip.model_dump()
-        trip_dict['stops'] = [
-            {
-                **stop.model_dump(),
-                'city': stop.city.model_dump(),
-                'activities': [act.model_dump() for act in stop.activities]
-            } for stop in trip.stops
-        ]
-        trip_dict['total_spent'] = total
-        trip_reads.append(TripRead(**trip_dict))
-        
-    return trip_reads
+        item = trip_serializer.summary(trip, totals.get(trip.id, 0.0))
+        item["view_count"] = trip.view_count
+        items.append(item)
+    return FeedPage(body=JSONBytesResponse(items).body, next_cursor=cursor_out)
+
+@router.get("/public", response_model=List[PublicTripRead], response_class=JSONBytesResponse)
+async def get_public_trips(
+    sort: FeedSort = FeedSort.NEWEST,
+    city: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    # No auth, no session dependency: pages come from feed_cache (see feed.py).
+    # Declared before /{trip_id} so "public" is not taken for a trip id.
+    city = city.strip() if city else None
+    key = (sort, city_key(city) if city else None, cursor, limit)
+    page = await feed_cache.get_or_build(key, lambda: _build_public_page(sort, city, cursor, limit))
+
+    headers = {"Cache-Control": f"public, max-age={settings.feed_cache_ttl_seconds}"}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    return JSONBytesResponse(page.body, headers=headers)
 
-@router.get("/{trip_id}", response_model=TripRead)
-def get_trip_details(
+@router.get("/search", response_model=List[TripSearchResult], response_class=JSONBytesResponse)
+async def search_trips(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
+):
+    # Declared before /{trip_id} so "search" is not taken for a trip id.
+    # Own and public trips, best match first (see search.py)
+    rows = (await session.exec(search_statement(session, q, current_user.id, cursor, limit))).all()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, score = rows[-1]
+        headers["X-Next-Cursor"] = encode_score_cursor(score, last.id)
+
+    totals = await rollup_totals(session, [trip.id for trip, _ in rows])
+    items = []
+    for trip, score in rows:
+        item = trip_serializer.summary(trip, totals.get(trip.id, 0.0))
+        item["score"] = score
+        items.append(item)
+    return JSONBytesResponse(items, headers=headers)
+
+@router.get("/export")
+async def export_my_trips(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    current_user: Principal = Depends(get_current_principal)
+):
+    # Declared before /{trip_id} so "export" is not taken for a trip id.
+    # Streams from a server-side cursor; nothing is built up in memory.
+    if format == "csv":
+        body, media_type = export_csv(current_user.id), "text/csv"
+    else:
+        body, media_type = export_ndjson(current_user.id), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="trips-export.{format}"'}
+    )
+
+async def _trip_version(session: AsyncSession, trip_id: int, current_user: Principal) -> int:
+    # One primary-key lookup: existence, permission (owner or public) and version
+    statement = select(Trip.owner_id, Trip.is_public, Trip.version).where(Trip.id == trip_id)
+    row = (await session.exec(statement)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    owner_id, is_public, version = row
+    if owner_id != current_user.id and not is_public:
+        raise HTTPException(status_code=403, detail="Not authorized to view this trip")
+    if owner_id != current_user.id:
+        # Someone else looking at a public trip (batched, see feed.py)
+        trip_views.record(trip_id)
+    return version
+
+@router.get("/{trip_id}", response_model=TripRead, response_class=JSONBytesResponse)
+async def get_trip_details(
     trip_id: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
 ):
+    # Version first: if a write lands in between, the body is newer than
+    # the ETag and the next poll simply fetches again
+    etag = trip_etag(trip_id, await _trip_version(session, trip_id, current_user))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
     statement = select(Trip).where(Trip.id == trip_id).options(
         selectinload(Trip.stops).selectinload(ItineraryStop.city),
         selectinload(Trip.stops).selectinload(ItineraryStop.activities)
     )
-    trip = session.exec(statement).first()
+    trip = (await session.exec(statement)).first()
     
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
@@ -188,84 +345,72 @@ def get_trip_details(
          raise HTTPException(status_code=403, detail="Not authorized to view this trip")
     
     # Calculate total spent
-    total_spent = sum(act.cost for stop in trip.stops for act in stop.activities)
+    total_spent = await rollup_total(session, trip.id)
     
-    # Return as TripRead with computed field
-    trip_dict = trip.model_dump()
-    # Explicitly map stops because model_dump might only dump immediate fields or fail on relations depending on config
-    # SQLModel model_dump generally doesn't recurse relations unless configured?
-    # Actually for response_model it does validation from ORM object. 
-    # But for 'total_spent' we need to pass it. 
-    # Let's construct TripRead explicitly using model_validate but passing extra context? 
-    # Or just dict construction.
-    
-    trip_dict['stops'] = [
-            {
-                **stop.model_dump(),
-                'city': stop.city.model_dump(),
-                'activities': [act.model_dump() for act in stop.activities]
-            } for stop in trip.stops
-        ]
-    trip_dict['total_spent'] = total_spent
-    
-    return TripRead(**trip_dict)
+    # TripRead shape, rendered in one pass (see serializers.py)
+    return JSONBytesResponse(trip_serializer.render_one(trip, total_spent), headers=cache_headers(etag))
 
 @router.get("/{trip_id}/stats")
-def get_trip_stats(
+async def get_trip_stats(
     trip_id: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    statement = select(Trip).where(Trip.id == trip_id).options(
-        selectinload(Trip.stops).selectinload(ItineraryStop.city),
-        selectinload(Trip.stops).selectinload(ItineraryStop.activities)
-    )
-    trip = session.exec(statement).first()
+    # Stats only need the trip row; the numbers come from the spend rollups
+    trip = await session.get(Trip, trip_id)
     
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     if trip.owner_id != current_user.id and not trip.is_public:
         raise HTTPException(status_code=403, detail="Not authorized")
+
+    etag = trip_etag(trip.id, trip.version, view="stats")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
         
-    # Calculations
-    total_budget = trip.budget_limit
-    total_spent = 0.0
-    category_breakdown = {}
-    city_breakdown = []
-    
-    for stop in trip.stops:
-        city_spent = 0.0
-        for act in stop.activities:
-            cost = act.cost
-            total_spent += cost
-            city_spent += cost
-            
-            # Category Breakdown
-            cat_name = act.category.value if act.category else "Other"
-            category_breakdown[cat_name] = category_breakdown.get(cat_name, 0) + cost
-            
-        city_breakdown.append({
-            "city": stop.city.name,
-            "amount": city_spent
-        })
-        
-    return {
-        "total_budget": total_budget,
-        "total_spent": total_spent,
-        "remaining_budget": total_budget - total_spent,
-        "category_breakdown": category_breakdown,
-        "city_breakdown": city_breakdown
-    }
+    return JSONBytesResponse(await rollup_stats(session, trip), headers=cache_headers(etag))
+
+@router.patch("/{trip_id}", response_model=TripSummaryRead, response_class=JSONBytesResponse)
+async def update_trip(
+    trip_id: int,
+    trip_data: TripUpdate,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
+):
+    trip = await session.get(Trip, trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    if trip.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not owner of this trip")
+
+    changes = trip_data.model_dump(exclude_unset=True)
+    if changes.get("title", trip.title) is None:
+        raise HTTPException(status_code=400, detail="Title cannot be empty")
+    was_public = trip.is_public
+    for field, value in changes.items():
+        setattr(trip, field, value)
+    session.add(trip)
+    await session.flush()
+
+    if "title" in changes or "description" in changes:
+        await index_documents(session, [trip_document(trip)])
+    await bump_trip_version(session, trip_id)
+    # Made private: its cached feed pages must go too
+    note_trip_change(session, was_public)
+    await session.commit()
+    await session.refresh(trip)
+    return JSONBytesResponse(trip_serializer.render_one(trip, await rollup_total(session, trip.id), summary=True))
 
 @router.post("/{trip_id}/stops", response_model=ItineraryStop)
-def add_stop_to_trip(
+async def add_stop_to_trip(
     trip_id: int,
     stop_data: StopCreate,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
 ):
     # 1. Verify Trip + Ownership
-    trip = session.get(Trip, trip_id)
+    trip = await session.get(Trip, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     if trip.owner_id != current_user.id:
@@ -273,23 +418,21 @@ def add_stop_to_trip(
     
     city_id = stop_data.city_id
     
-    # Handle City Name if provided
+    # Handle City Name if provided (created in the same transaction as the stop)
     if not city_id and stop_data.city_name:
-        city = session.exec(select(City).where(City.name == stop_data.city_name)).first()
-        if not city:
-            city = City(name=stop_data.city_name, country="Unknown")
-            session.add(city)
-            session.commit()
-            session.refresh(city)
-        city_id = city.id
+        cities = await resolve_cities(session, [stop_data.city_name])
+        city = cities.get(city_key(stop_data.city_name)) # None only for a blank name
+        if city:
+            city_id = city.id
         
     if not city_id:
         raise HTTPException(status_code=400, detail="City ID or Name required")
         
-    # 2. Verify City (Redundant if we just created it, but good safety)
-    city = session.get(City, city_id)
-    if not city:
-        raise HTTPException(status_code=404, detail="City not found")
+    # 2. Verify City when the client passed an id
+    if stop_data.city_id:
+        city = await session.get(City, city_id)
+        if not city:
+            raise HTTPException(status_code=404, detail="City not found")
         
     # 3. Create Stop
     new_stop = ItineraryStop(
@@ -300,34 +443,120 @@ def add_stop_to_trip(
         departure_date=stop_data.departure_date
     )
     session.add(new_stop)
-    session.commit()
-    session.refresh(new_stop)
+    await session.flush() # Assigns new_stop.id for its search document
+    await index_documents(session, [stop_document(new_stop.id, trip_id, city)])
+    await bump_trip_version(session, trip_id)
+    await session.commit()
+    city_index.record_usage([city])
+    await session.refresh(new_stop)
     return new_stop
 
 @router.post("/stops/{stop_id}/activities", response_model=Activity)
-def add_activity_to_stop(
+async def add_activity_to_stop(
     stop_id: int,
     activity_data: ActivityCreate,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    # 1. Verify Stop
-    stop = session.get(ItineraryStop, stop_id)
-    if not stop:
+    # 1. Verify Stop and fetch its trip's owner in the same query
+    # (lazy loading stop.trip is not allowed on an AsyncSession)
+    statement = (
+        select(ItineraryStop, Trip.owner_id)
+        .join(Trip, ItineraryStop.trip_id == Trip.id)
+        .where(ItineraryStop.id == stop_id)
+    )
+    row = (await session.exec(statement)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Stop not found")
+    stop, owner_id = row
         
-    # 2. Verify Trip Ownership (via stop.trip)
-    # Note: stop.trip is lazy loaded, but session.get usually works perfectly for this check or we query join
-    # For safety with SQLModel sync, access attribute triggers fetch
-    if stop.trip.owner_id != current_user.id:
+    # 2. Verify Trip Ownership
+    if owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not owner of this trip")
         
     # 3. Create Activity
     new_activity = Activity(
         stop_id=stop_id,
-        **activity_data.dict()
+        **activity_data.model_dump()
     )
     session.add(new_activity)
-    session.commit()
-    session.refresh(new_activity)
+    # Keep the spend rollups in the same transaction as the activity itself
+    await record_activity_added(session, new_activity, stop.trip_id)
+    await session.flush() # Assigns new_activity.id for its search document
+    await index_documents(session, [
+        activity_document(new_activity.id, stop.trip_id, new_activity.title, new_activity.description)
+    ])
+    await bump_trip_version(session, stop.trip_id)
+    await session.commit()
+    await session.refresh(new_activity)
     return new_activity
+
+# --- BULK IMPORT ---
+# Body: CSV (header row of ActivityCreate field names) or NDJSON (one
+# ActivityCreate object per line), streamed -- never read into memory whole.
+
+async def _run_import(request: Request, format: Optional[str], session: AsyncSession, trip_id: int, resolve_stop, all_or_nothing: bool):
+    parse = iter_csv_rows if detect_format(request.headers.get("content-type"), format) == "csv" else iter_ndjson_rows
+    report = await import_activities(session, parse(request.stream()), ActivityCreate, trip_id, resolve_stop)
+
+    if all_or_nothing and report.failed:
+        await session.rollback()
+        report.imported = 0
+    else:
+        if report.imported:
+            await bump_trip_version(session, trip_id)
+        await session.commit()
+    return report
+
+@router.post("/stops/{stop_id}/activities/import", response_model=ImportReport)
+async def import_stop_activities(
+    stop_id: int,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    all_or_nothing: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
+):
+    # Ownership is checked once for the whole upload
+    statement = (
+        select(ItineraryStop.trip_id, Trip.owner_id)
+        .join(Trip, ItineraryStop.trip_id == Trip.id)
+        .where(ItineraryStop.id == stop_id)
+    )
+    row = (await session.exec(statement)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Stop not found")
+    trip_id, owner_id = row
+    if owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not owner of this trip")
+
+    return await _run_import(request, format, session, trip_id, lambda row: stop_id, all_or_nothing)
+
+@router.post("/{trip_id}/activities/import", response_model=ImportReport)
+async def import_trip_activities(
+    trip_id: int,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    all_or_nothing: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal)
+):
+    trip = await session.get(Trip, trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    if trip.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not owner of this trip")
+
+    # Every row names its stop; only this trip's stops are accepted
+    stop_ids = set((await session.exec(select(ItineraryStop.id).where(ItineraryStop.trip_id == trip_id))).all())
+
+    def resolve_stop(row: dict):
+        try:
+            stop_id = int(row.get("stop_id"))
+        except (TypeError, ValueError):
+            return "stop_id: a stop id of this trip is required"
+        if stop_id not in stop_ids:
+            return f"stop_id: stop {stop_id} is not part of this trip"
+        return stop_id
+
+    return await _run_import(request, format, session, trip_id, resolve_stop, all_or_nothing)
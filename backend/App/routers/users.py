@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Optional
 from pydantic import BaseModel
 
-from ..database import get_session
+from ..avatars import save_avatar, variant_worker
+from ..database import get_async_session
 from ..models import User
-from ..oauth2 import get_current_user
+from ..oauth2 import get_current_user, invalidate_user
+from ..storage import replace
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -15,17 +18,17 @@ class UserProfileUpdate(BaseModel):
     home_city: Optional[str] = None
 
 @router.get("/me", response_model=User)
-def get_current_user_profile(current_user: User = Depends(get_current_user)):
+async def get_current_user_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.put("/profile", response_model=User)
-def update_user_profile(
+async def update_user_profile(
     profile_data: UserProfileUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ):
     # Fetch fresh user object from session to ensure tracking
-    user = session.get(User, current_user.id)
+    user = await session.get(User, current_user.id)
     if not user:
          raise HTTPException(status_code=404, detail="User not found")
     
@@ -37,40 +40,32 @@ def update_user_profile(
         user.home_city = profile_data.home_city
         
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    invalidate_user(user.id)
     return user
 
 @router.post("/avatar", response_model=User)
-def upload_avatar(
+async def upload_avatar(
     file: UploadFile = File(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ):
-    import shutil
-    import os
+    # Content-addressed: the same image always gets the same URL
+    # URL is a relative path served by StaticFiles, see main.py
+    avatar_url = await save_avatar(file)
     
-    # Create upload directory if not exists
-    UPLOAD_DIR = "App/uploads"
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    user = await session.get(User, current_user.id)
+    if user.avatar_url == avatar_url:
+        return user
     
-    # Generate unique filename or overwrite user's file
-    # Simple strategy: user_{id}_avatar.ext
-    file_ext = file.filename.split('.')[-1]
-    filename = f"user_{current_user.id}_avatar.{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    # Update user profile
-    # URL should be relative path served by StaticFiles
-    # In main.py: app.mount("/static", StaticFiles(directory="App/uploads"), name="static")
-    avatar_url = f"/static/{filename}"
-    
-    user = session.get(User, current_user.id)
+    # Update user profile; thumbnails follow from the background worker
+    await replace(session, user.avatar_url, avatar_url)
     user.avatar_url = avatar_url
+    user.avatar_variants = None
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    invalidate_user(user.id)
+    variant_worker.enqueue(user.id, avatar_url)
     return user
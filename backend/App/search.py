@@ -0,0 +1,232 @@
+# app/search.py
+import re
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Float, Integer, bindparam, or_, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .cities import DEFAULT_COUNTRY
+from .config import settings
+from .models import Activity, City, ItineraryStop, Trip
+from .pagination import keyset_after_score
+
+# Full-text search over trips, the cities they stop in and their activities.
+# Every searchable row has one document in `search_document`, keyed by
+# doc_id = row id * 4 + kind, so a single table holds all three kinds and a
+# document is replaced by primary key. Documents are written by
+# index_documents() BEFORE commit, in the same transaction as the rows they
+# mirror (like the spend rollups), so an activity insert costs one index
+# insert, not a reindex. rebuild_search.py rebuilds the table from scratch.
+#
+# Backends, picked by dialect:
+#   - PostgreSQL: tsvector column with a GIN index, ranked by ts_rank
+#   - SQLite: FTS5 virtual table (porter stemming), ranked by bm25
+# On anything else search is off: writes skip indexing, searches get 501.
+#
+# Queries are split into words and each word matches as a prefix ("mus"
+# finds "museum"). A document matches if it has any of the words; a trip's
+# score is the sum over its matching documents, weighted by kind, so trips
+# matching more words (in their title, more than in an activity) rank first.
+
+TRIP, STOP, ACTIVITY = 0, 1, 2
+KIND_WEIGHTS = {TRIP: 3.0, STOP: 2.0, ACTIVITY: 1.0}
+MAX_TERMS = 8
+WORD = re.compile(r"\w+")
+
+def _weight_case(doc_id_col: str) -> str:
+    whens = " ".join(f"WHEN {kind} THEN {weight}" for kind, weight in KIND_WEIGHTS.items())
+    return f"CASE {doc_id_col} % 4 {whens} ELSE 1.0 END"
+
+class PostgresSearch:
+    schema = [
+        """CREATE TABLE IF NOT EXISTS search_document (
+            doc_id BIGINT PRIMARY KEY,
+            trip_id INTEGER NOT NULL REFERENCES trip (id) ON DELETE CASCADE,
+            document TSVECTOR NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_search_document_document ON search_document USING GIN (document)",
+        "CREATE INDEX IF NOT EXISTS ix_search_document_trip_id ON search_document (trip_id)",
+    ]
+    upsert = text(
+        "INSERT INTO search_document (doc_id, trip_id, document) "
+        "VALUES (:doc_id, :trip_id, to_tsvector(CAST(:config AS regconfig), :body)) "
+        "ON CONFLICT (doc_id) DO UPDATE SET trip_id = EXCLUDED.trip_id, document = EXCLUDED.document"
+    )
+
+    def params(self, document: dict) -> dict:
+        return {**document, "config": settings.search_language}
+
+    def match_query(self, terms: List[str]) -> str:
+        # Words only (see WORD), so nothing here can be tsquery syntax
+        return " | ".join(f"{term}:*" for term in terms)
+
+    def hits(self):
+        return text(
+            # float8 so the score survives the cursor round trip exactly
+            f"SELECT trip_id, CAST(SUM(ts_rank(document, query) * {_weight_case('doc_id')}) AS DOUBLE PRECISION) AS score "
+            "FROM search_document, to_tsquery(CAST(:config AS regconfig), :query) AS query "
+            "WHERE document @@ query GROUP BY trip_id"
+        ).bindparams(config=settings.search_language)
+
+class SqliteSearch:
+    schema = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS search_document USING fts5(
+            body, trip_id UNINDEXED, tokenize = 'porter unicode61 remove_diacritics 2'
+        )""",
+    ]
+    # rowid is the doc_id
+    upsert = text("INSERT OR REPLACE INTO search_document (rowid, body, trip_id) VALUES (:doc_id, :body, :trip_id)")
+
+    def params(self, document: dict) -> dict:
+        return document
+
+    def match_query(self, terms: List[str]) -> str:
+        return " OR ".join(f'"{term}"*' for term in terms)
+
+    def hits(self):
+        # bm25() is not allowed inside an aggregate: score the matches in a
+        # materialized CTE first, then sum per trip. bm25 is lower-is-better.
+        return text(
+            "WITH matches AS MATERIALIZED ("
+            "SELECT rowid AS doc_id, trip_id, bm25(search_document) AS rank "
+            "FROM search_document WHERE search_document MATCH :query) "
+            f"SELECT trip_id, SUM(-rank * {_weight_case('doc_id')}) AS score "
+            "FROM matches GROUP BY trip_id"
+        )
+
+BACKENDS = {"postgresql": PostgresSearch(), "sqlite": SqliteSearch()}
+
+def search_backend(session) -> Optional[object]:
+    return BACKENDS.get(session.bind.dialect.name)
+
+def create_search_schema(connection):
+    """Sync, for metadata-style setup: conn.run_sync(create_search_schema)."""
+    backend = BACKENDS.get(connection.dialect.name)
+    if backend is None:
+        return
+    for statement in backend.schema:
+        connection.exec_driver_sql(statement)
+
+# --- DOCUMENTS ---
+
+def _document(kind: int, row_id: int, trip_id: int, *parts: Optional[str]) -> dict:
+    return {
+        "doc_id": row_id * 4 + kind,
+        "trip_id": trip_id,
+        "body": " ".join(part for part in parts if part),
+    }
+
+def trip_document(trip: Trip) -> dict:
+    return _document(TRIP, trip.id, trip.id, trip.title, trip.description, trip.destination_cache)
+
+def stop_document(stop_id: int, trip_id: int, city: City) -> dict:
+    country = city.country if city.country != DEFAULT_COUNTRY else None
+    return _document(STOP, stop_id, trip_id, city.name, country)
+
+def activity_document(activity_id: int, trip_id: int, title: str, description: Optional[str]) -> dict:
+    return _document(ACTIVITY, activity_id, trip_id, title, description)
+
+# --- WRITE PATH ---
+
+async def index_documents(session: AsyncSession, documents: Iterable[dict]):
+    """Insert or replace documents. Runs in the caller's transaction; the
+    caller commits. No-op where there is no search backend."""
+    backend = search_backend(session)
+    documents = list(documents)
+    if backend is None or not documents:
+        return
+    await session.exec(backend.upsert, params=[backend.params(document) for document in documents])
+
+# --- READ PATH ---
+
+def search_terms(query: str) -> List[str]:
+    terms = list(dict.fromkeys(WORD.findall(query.lower())))[:MAX_TERMS]
+    if not terms:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query has no words"
+        )
+    return terms
+
+def search_statement(session: AsyncSession, query: str, user_id: int, cursor: Optional[str], limit: int):
+    """(Trip, score) rows the user may see (own or public), best first,
+    keyset-paginated on (score, id). Fetches limit + 1 rows."""
+    backend = search_backend(session)
+    if backend is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is not available on this database"
+        )
+    hits = (
+        backend.hits()
+        .bindparams(bindparam("query", backend.match_query(search_terms(query))))
+        .columns(trip_id=Integer, score=Float)
+        .subquery("hits")
+    )
+    statement = (
+        select(Trip, hits.c.score)
+        .join(hits, hits.c.trip_id == Trip.id)
+        .where(or_(Trip.owner_id == user_id, Trip.is_public == True))  # noqa: E712
+        .order_by(hits.c.score.desc(), Trip.id.desc())
+    )
+    after = keyset_after_score(hits.c.score, Trip.id, cursor)
+    if after is not None:
+        statement = statement.where(after)
+    return statement.limit(limit + 1)
+
+# --- REBUILD ---
+
+def _document_sources():
+    """name -> (statement, row -> document). Column rows, so the same
+    statements serve an AsyncSession and a sync Connection."""
+    return {
+        "trips": (select(Trip.id, Trip.title, Trip.description, Trip.destination_cache), trip_document),
+        "stops": (
+            select(ItineraryStop.id, ItineraryStop.trip_id, City.name, City.country)
+            .join(City, ItineraryStop.city_id == City.id),
+            lambda row: stop_document(row.id, row.trip_id, row),
+        ),
+        "activities": (
+            select(Activity.id, ItineraryStop.trip_id, Activity.title, Activity.description)
+            .join(ItineraryStop, Activity.stop_id == ItineraryStop.id),
+            lambda row: activity_document(*row),
+        ),
+    }
+
+async def rebuild_search_index(session: AsyncSession, batch_size: int = 1000) -> Dict[str, int]:
+    """Replace every document with one built from the current rows.
+    Runs in the caller's transaction; the caller commits."""
+    backend = search_backend(session)
+    if backend is None:
+        raise RuntimeError(f"No search backend for {session.bind.dialect.name}")
+    await session.exec(text("DELETE FROM search_document"))
+
+    counts = {}
+    for name, (statement, build) in _document_sources().items():
+        counts[name] = 0
+        result = await session.stream(statement.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            documents = [build(row) for row in rows]
+            await index_documents(session, documents)
+            counts[name] += len(documents)
+    return counts
+
+def rebuild_search_index_sync(connection, batch_size: int = 1000) -> Dict[str, int]:
+    """rebuild_search_index on a sync Connection (migrations). Does nothing
+    where there is no search backend."""
+    backend = BACKENDS.get(connection.dialect.name)
+    if backend is None:
+        return {}
+    connection.execute(text("DELETE FROM search_document"))
+
+    counts = {}
+    for name, (statement, build) in _document_sources().items():
+        counts[name] = 0
+        result = connection.execute(statement.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            documents = [backend.params(build(row)) for row in rows]
+            connection.execute(backend.upsert, documents)
+            counts[name] += len(documents)
+    return counts
@@ -0,0 +1,65 @@
+# app/serializers.py
+from typing import Dict, Iterable, Sequence
+
+import orjson
+from fastapi.responses import Response
+
+# One-pass JSON for trip payloads.
+# The response schemas in routers/trips.py stay the source of truth (field
+# names, order, OpenAPI docs), but rendering skips pydantic entirely: ORM
+# objects -- or any row with attribute access -- are read field by field into
+# plain dicts and handed straight to orjson, which encodes dates, times,
+# datetimes and str-Enums natively. No model_dump() copies, no validation
+# into TripRead, and no second validation pass through response_model.
+
+class JSONBytesResponse(Response):
+    """application/json from bytes that are already rendered."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
+
+def _pick(obj, fields: Sequence[str]) -> dict:
+    return {name: getattr(obj, name) for name in fields}
+
+class TripSerializer:
+    def __init__(
+        self,
+        trip_fields: Sequence[str],
+        stop_fields: Sequence[str],
+        city_fields: Sequence[str],
+        activity_fields: Sequence[str],
+    ):
+        self.trip_fields = tuple(trip_fields)
+        self.stop_fields = tuple(stop_fields)
+        self.city_fields = tuple(city_fields)
+        self.activity_fields = tuple(activity_fields)
+
+    def summary(self, trip, total_spent: float) -> dict:
+        data = _pick(trip, self.trip_fields)
+        data["total_spent"] = total_spent
+        return data
+
+    def full(self, trip, total_spent: float) -> dict:
+        data = _pick(trip, self.trip_fields)
+        activity_fields = self.activity_fields
+        data["stops"] = [
+            {
+                **_pick(stop, self.stop_fields),
+                "city": _pick(stop.city, self.city_fields),
+                "activities": [_pick(activity, activity_fields) for activity in stop.activities],
+            }
+            for stop in trip.stops
+        ]
+        data["total_spent"] = total_spent
+        return data
+
+    def render_one(self, trip, total_spent: float, summary: bool = False) -> bytes:
+        build = self.summary if summary else self.full
+        return orjson.dumps(build(trip, total_spent))
+
+    def render_many(self, trips: Iterable, totals: Dict[int, float], summary: bool = False) -> bytes:
+        build = self.summary if summary else self.full
+        return orjson.dumps([build(trip, totals.get(trip.id, 0.0)) for trip in trips])
@@ -0,0 +1,189 @@
+# app/slow_queries.py
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import current_route
+from .query_inspector import fingerprint
+
+# Slow-query log, opt-in via SLOW_QUERY_MS (see database.py).
+# Every statement slower than the threshold is logged with its route and
+# aggregated by fingerprint (query_inspector.fingerprint), so one lookup or
+# selectinload chain that regresses as tables grow shows up as ONE entry
+# with a count, total/max time and the routes that ran it.
+# Parameters are never kept: only their types (redact()).
+#
+# The plan is captured right after the slow statement, on the same DBAPI
+# connection (same transaction, same data) but through a raw cursor, so it
+# fires no engine events and is not counted as a request statement:
+#   - SQLite: EXPLAIN QUERY PLAN
+#   - Postgres: EXPLAIN, or EXPLAIN (ANALYZE, BUFFERS) for a sampled
+#     fraction (SLOW_QUERY_ANALYZE_RATE) of SELECTs. ANALYZE runs the query
+#     again, so never for writes; it sits in a savepoint that is rolled back,
+#     and a failing EXPLAIN cannot abort the caller's transaction.
+# A plan is captured once per fingerprint per plan_interval_seconds -- a
+# statement that is slow every time would otherwise double its own cost.
+
+logger = logging.getLogger(__name__)
+
+_SAVEPOINT = "slow_query_explain"
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE") # Not DDL, PRAGMA, ...
+
+def redact(parameters) -> object:
+    """Parameter types (and string lengths), never values."""
+    def kind(value):
+        if isinstance(value, (str, bytes)):
+            return f"{type(value).__name__}({len(value)})"
+        return type(value).__name__
+
+    if isinstance(parameters, dict):
+        return {name: kind(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [kind(value) for value in parameters]
+    return kind(parameters)
+
+class SlowQuery:
+    __slots__ = ("fingerprint", "count", "total_seconds", "max_seconds", "routes",
+                 "parameters", "plan", "plan_analyzed", "plan_captured_at", "last_seen")
+
+    def __init__(self, shape: str):
+        self.fingerprint = shape
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.routes: Dict[str, int] = {}
+        self.parameters = None
+        self.plan: Optional[List[str]] = None
+        self.plan_analyzed = False
+        self.plan_captured_at = 0.0 # monotonic
+        self.last_seen = 0.0 # wall clock
+
+    def snapshot(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "mean_ms": round(self.total_seconds * 1000 / self.count, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "routes": dict(sorted(self.routes.items(), key=lambda item: -item[1])),
+            "parameters": self.parameters,
+            "plan": self.plan,
+            "plan_analyzed": self.plan_analyzed,
+            "last_seen": self.last_seen,
+        }
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float,
+        analyze_rate: float = 0.0,
+        plan_interval_seconds: float = 300.0,
+        max_entries: int = 500,
+    ):
+        self.threshold_seconds = threshold_ms / 1000
+        self.analyze_rate = analyze_rate
+        self.plan_interval_seconds = plan_interval_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, SlowQuery] = {}
+
+    def attach(self, engine: Engine):
+        """Watch the engine's statements. For an AsyncEngine pass .sync_engine."""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _started(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _finished(conn, cursor, statement, parameters, context, executemany):
+            seconds = time.perf_counter() - conn.info["slow_query_started"].pop()
+            if seconds >= self.threshold_seconds:
+                self.observe(conn, statement, parameters, executemany, seconds)
+
+        @event.listens_for(engine, "handle_error")
+        def _failed(exception_context):
+            conn = exception_context.connection
+            started = conn.info.get("slow_query_started") if conn is not None else None
+            if started:
+                started.pop()
+
+    def observe(self, conn, statement: str, parameters, executemany: bool, seconds: float):
+        shape = fingerprint(statement)
+        route = current_route() or "background"
+        if executemany:
+            # One plan stands for the batch
+            parameters = parameters[0] if parameters else None
+
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    # Forget the least frequent shape
+                    del self._entries[min(self._entries.values(), key=lambda e: e.count).fingerprint]
+                entry = self._entries[shape] = SlowQuery(shape)
+            entry.count += 1
+            entry.total_seconds += seconds
+            entry.max_seconds = max(entry.max_seconds, seconds)
+            entry.routes[route] = entry.routes.get(route, 0) + 1
+            entry.parameters = redact(parameters) if parameters is not None else None
+            entry.last_seen = time.time()
+            now = time.monotonic()
+            capture_plan = entry.plan is None or now - entry.plan_captured_at >= self.plan_interval_seconds
+            if capture_plan:
+                entry.plan_captured_at = now # Claimed; concurrent slow runs skip it
+
+        logger.warning("Slow query (%.1f ms) in %s: %s", seconds * 1000, route, shape)
+        keyword = statement.lstrip()[:6].upper().rstrip()
+        if capture_plan and keyword in _EXPLAINABLE:
+            analyze = (
+                conn.dialect.name == "postgresql"
+                and keyword in ("SELECT", "WITH")
+                and random.random() < self.analyze_rate
+            )
+            plan = explain(conn, statement, parameters, analyze)
+            with self._lock:
+                entry.plan, entry.plan_analyzed = plan, analyze
+
+    def snapshot(self) -> List[dict]:
+        """Aggregated findings, most total time first."""
+        with self._lock:
+            entries = [entry.snapshot() for entry in self._entries.values()]
+        return sorted(entries, key=lambda entry: -entry["total_ms"])
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+def explain(conn, statement: str, parameters, analyze: bool = False) -> Optional[List[str]]:
+    """The statement's plan as text lines, on `conn`'s own DBAPI connection."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    else:
+        return None
+
+    cursor = conn.connection.dbapi_connection.cursor()
+    savepoint = dialect == "postgresql"
+    try:
+        if savepoint:
+            cursor.execute(f"SAVEPOINT {_SAVEPOINT}")
+        try:
+            cursor.execute(prefix + statement, parameters or ())
+            rows = cursor.fetchall()
+        finally:
+            if savepoint:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {_SAVEPOINT}")
+                cursor.execute(f"RELEASE SAVEPOINT {_SAVEPOINT}")
+    except Exception as error:
+        return [f"EXPLAIN failed: {error}"]
+    finally:
+        cursor.close()
+    # SQLite: (id, parent, notused, detail); Postgres: one text column
+    return [str(row[-1]) for row in rows]
@@ -0,0 +1,101 @@
+# app/static.py
+import mimetypes
+import os
+import re
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Cache-aware serving of /static (App/uploads).
+# Content-addressed names (see storage.py) never change content, so they are
+# served as immutable with their hash as a strong ETag. Anything else must be
+# revalidated, which If-None-Match turns into a cheap 304.
+# "<hash>_<size>.jpg" thumbnails are swapped for their .webp sibling (see
+# avatars.py) when the client accepts image/webp.
+# Large files go out through the ASGI zero-copy send extension when the server
+# offers it (Starlette already uses pathsend on its own).
+
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}(_\d+)?\.[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+SENDFILE_MIN_BYTES = 256 * 1024
+
+def accepts(header: Optional[str], token: str) -> bool:
+    """True if `token` (or a wildcard covering it) is listed with q > 0."""
+    if not header:
+        return False
+    wildcards = {"*", "*/*", token.split("/")[0] + "/*"}
+    for item in header.lower().split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        if value != token and value not in wildcards:
+            continue
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    return float(param[2:]) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    # Sync on purpose: file_response() is sync in Starlette, and a local stat
+    # of a file we are about to send costs microseconds
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+class SendfileResponse(FileResponse):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get("extensions") or {}
+        if (
+            "http.response.zerocopysend" in extensions
+            and "http.response.pathsend" not in extensions
+            and scope["method"] == "GET"
+            and "range" not in Headers(scope=scope)
+            and self.stat_result is not None
+            and self.stat_result.st_size >= SENDFILE_MIN_BYTES
+        ):
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "count": self.stat_result.st_size})
+            return
+        await super().__call__(scope, receive, send)
+
+class UploadFiles(StaticFiles):
+    # Uploads are images, compressed already
+    no_compression = True
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        path = str(full_path)
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        headers = {}
+
+        # WebP thumbnail instead of JPEG
+        if HASHED_NAME.match(os.path.basename(path)) and path.endswith(".jpg"):
+            webp_path = path[:-len(".jpg")] + ".webp"
+            webp_stat = _stat(webp_path)
+            if webp_stat is not None:
+                headers["Vary"] = "Accept"
+                if accepts(request_headers.get("accept"), "image/webp"):
+                    path, stat_result, media_type = webp_path, webp_stat, "image/webp"
+
+        response = SendfileResponse(
+            path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        served = os.path.basename(path)
+        if HASHED_NAME.match(os.path.basename(str(full_path))):
+            # The name is the content hash: a strong validator for free
+            response.headers["etag"] = f'"{served}"'
+            response.headers["cache-control"] = IMMUTABLE
+        else:
+            response.headers["cache-control"] = REVALIDATE
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,190 @@
+# app/storage.py
+import hashlib
+import os
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+import anyio
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import StoredBlob, Trip, User
+
+# Content-addressed upload storage.
+# Every upload is stored once, as <sha256><ext>: uploading the same bytes again
+# returns the same URL and writes nothing new. A name never changes content,
+# so its URL can be cached forever.
+#
+# StoredBlob.ref_count tracks how many User.avatar_url / Trip.cover_image_url
+# values point at a blob. Every write that sets or clears one of them calls
+# retain() / release() BEFORE committing, like the spend rollups.
+# gc_uploads.py recounts from those columns and deletes unreferenced files
+# once they are older than a grace period (which also covers uploads whose
+# row is not committed yet).
+
+UPLOAD_DIR = Path("App/uploads")
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True) # StaticFiles needs it at mount time
+STATIC_PREFIX = "/static/"
+CHUNK_SIZE = 64 * 1024
+
+# Columns holding upload URLs
+REFERENCE_COLUMNS = (User.avatar_url, Trip.cover_image_url)
+
+def blob_name(url: Optional[str]) -> Optional[str]:
+    """"/static/<name>" -> "<name>"; None for URLs we don't store (e.g. Google pictures)."""
+    if not url or not url.startswith(STATIC_PREFIX):
+        return None
+    name = url[len(STATIC_PREFIX):]
+    if not name or "/" in name or "\\" in name or name.startswith("."):
+        return None
+    return name
+
+def local_path(url: Optional[str]) -> Optional[Path]:
+    name = blob_name(url)
+    return UPLOAD_DIR / name if name else None
+
+async def store(
+    chunks: AsyncIterator[bytes],
+    extension: str,
+    max_bytes: int,
+    too_large: Callable[[], Exception]
+) -> str:
+    """Stream chunks to disk, hashing as they go. Returns the blob's /static URL."""
+    digest = hashlib.sha256()
+    # Dot-prefixed temporary name: never handed out as a URL
+    partial = anyio.Path(UPLOAD_DIR / f".{uuid.uuid4().hex}.part")
+    written = 0
+    try:
+        async with await anyio.open_file(partial, "wb") as out:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > max_bytes:
+                    raise too_large()
+                digest.update(chunk)
+                await out.write(chunk)
+
+        name = digest.hexdigest() + extension
+        final = anyio.Path(UPLOAD_DIR / name)
+        if await final.exists():
+            # Same bytes already stored. Touch it so GC's grace period restarts.
+            await partial.unlink()
+            await final.touch()
+        else:
+            await partial.rename(final)
+    except BaseException:
+        await partial.unlink(missing_ok=True)
+        raise
+    return STATIC_PREFIX + name
+
+# --- REFERENCE COUNTS ---
+
+async def _bump(session: AsyncSession, name: str, delta: int) -> bool:
+    result = await session.exec(
+        update(StoredBlob)
+        .where(StoredBlob.name == name)
+        .values(ref_count=StoredBlob.ref_count + delta, updated_at=datetime.utcnow())
+    )
+    return result.rowcount > 0
+
+async def retain(session: AsyncSession, url: Optional[str]):
+    name = blob_name(url)
+    if name is None:
+        return
+    if await _bump(session, name, +1):
+        return
+    # First reference. A concurrent first reference may insert the row between
+    # our UPDATE and INSERT; the savepoint keeps the transaction usable.
+    try:
+        async with session.begin_nested():
+            session.add(StoredBlob(name=name, ref_count=1))
+    except IntegrityError:
+        await _bump(session, name, +1)
+
+async def release(session: AsyncSession, url: Optional[str]):
+    name = blob_name(url)
+    if name is not None:
+        # No row (e.g. a file from before this table): nothing to count down
+        await _bump(session, name, -1)
+
+async def replace(session: AsyncSession, old_url: Optional[str], new_url: Optional[str]):
+    if old_url != new_url:
+        await retain(session, new_url)
+        await release(session, old_url)
+
+# --- VERIFY / GC (gc_uploads.py) ---
+
+async def count_references(session: AsyncSession) -> Dict[str, int]:
+    counts = Counter()
+    for column in REFERENCE_COLUMNS:
+        statement = (
+            select(column, func.count())
+            .where(column.startswith(STATIC_PREFIX))
+            .group_by(column)
+        )
+        for url, count in (await session.exec(statement)).all():
+            name = blob_name(url)
+            if name is not None:
+                counts[name] += count
+    return counts
+
+async def find_drift(session: AsyncSession) -> List[dict]:
+    expected = await count_references(session)
+    stored = dict((await session.exec(select(StoredBlob.name, StoredBlob.ref_count))).all())
+    drift = []
+    for name in expected.keys() | stored.keys():
+        if expected.get(name, 0) != stored.get(name, 0):
+            drift.append({"name": name, "expected": expected.get(name, 0), "actual": stored.get(name)})
+    return sorted(drift, key=lambda row: row["name"])
+
+async def recount(session: AsyncSession, drift: Iterable[dict]):
+    """Apply find_drift() results. Runs in the caller's transaction."""
+    for row in drift:
+        if row["actual"] is None:
+            session.add(StoredBlob(name=row["name"], ref_count=row["expected"]))
+        else:
+            await session.exec(
+                update(StoredBlob)
+                .where(StoredBlob.name == row["name"])
+                .values(ref_count=row["expected"], updated_at=datetime.utcnow())
+            )
+
+def _owner(filename: str) -> str:
+    # "<stem>_64.webp" is a variant of "<stem>.<ext>" (see avatars.py)
+    stem = Path(filename).stem
+    base, _, size = stem.rpartition("_")
+    return base if base and size.isdigit() else stem
+
+def sweep_files(keep: Iterable[str], older_than: float, dry_run: bool = False) -> List[str]:
+    """Delete files in UPLOAD_DIR (and their variants) not named in `keep`
+    and last modified before the `older_than` timestamp."""
+    keep_stems = {Path(name).stem for name in keep}
+    removed = []
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.stat().st_mtime >= older_than:
+                continue
+            if _owner(entry.name) in keep_stems or Path(entry.name).stem in keep_stems:
+                continue
+            if not dry_run:
+                os.remove(entry.path)
+            removed.append(entry.name)
+    return sorted(removed)
+
+async def blobs_to_keep(session: AsyncSession, older_than: datetime) -> List[str]:
+    """Referenced blobs, plus ones released too recently to collect."""
+    statement = select(StoredBlob.name).where(
+        (StoredBlob.ref_count > 0) | (StoredBlob.updated_at >= older_than)
+    )
+    return list((await session.exec(statement)).all())
+
+async def forget_unreferenced(session: AsyncSession, older_than: datetime) -> int:
+    """Drop rows of blobs nobody has referenced since `older_than`."""
+    result = await session.exec(
+        delete(StoredBlob).where(StoredBlob.ref_count <= 0, StoredBlob.updated_at < older_than)
+    )
+    return result.rowcount
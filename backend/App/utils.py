@@ -1,11 +1,12 @@
 # app/utils.py
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt
 from .config import settings
+from .passwords import make_crypt_context
 
 # Setup the hashing engine (bcrypt is the industry standard)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Blocking helpers for scripts; request handlers use passwords.password_service
+pwd_context = make_crypt_context(settings.bcrypt_rounds)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
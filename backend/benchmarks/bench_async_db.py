@@ -0,0 +1,153 @@
+"""Sync (threadpool) vs async database path under concurrent load.
+
+Every simulated request runs one query that takes --latency-ms inside the
+database (pg_sleep on Postgres, a registered sleep function on SQLite), the
+way a slow network round trip would. The "sync" mode runs it like our old
+`def` endpoints did: a blocking Session inside Starlette's threadpool
+(40 tokens). The "async" mode uses AsyncSession on the event loop.
+
+While the load runs, a probe schedules a no-op on the threadpool every 10ms,
+the same thing any other `def` endpoint or dependency needs to make progress.
+Probe latency is what users of *other* endpoints feel while the DB is busy.
+
+Usage (from backend/):
+    python -m benchmarks.bench_async_db --database-url sqlite:///bench.db
+    python -m benchmarks.bench_async_db --requests 1000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import anyio
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from App.config import to_async_url
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies_ms):
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": round(statistics.fmean(latencies_ms), 2) if latencies_ms else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+    }
+
+def sleep_statement(url: str, latency_ms: int):
+    if url.startswith("sqlite"):
+        return text("SELECT bench_sleep(:ms)").bindparams(ms=latency_ms)
+    return text("SELECT pg_sleep(:s)").bindparams(s=latency_ms / 1000)
+
+def install_sqlite_sleep(sync_engine):
+    @event.listens_for(sync_engine, "connect")
+    def _register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("bench_sleep", 1, lambda ms: time.sleep(ms / 1000) or 1)
+
+async def probe(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await anyio.to_thread.run_sync(lambda: None)
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+async def drive(handler, requests: int, concurrency: int):
+    latencies = []
+    probe_samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await handler()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, probe_samples))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "request_latency": summarize(latencies),
+        "threadpool_probe_latency": summarize(probe_samples),
+    }
+
+async def run_sync_mode(url, args):
+    engine = create_engine(url, pool_size=args.pool_size, max_overflow=0, pool_timeout=60)
+    if url.startswith("sqlite"):
+        install_sqlite_sleep(engine)
+    statement = sleep_statement(url, args.latency_ms)
+
+    def blocking_handler():
+        with Session(engine) as session:
+            session.exec(statement).all()
+
+    async def handler():
+        # What FastAPI does for a `def` endpoint
+        await anyio.to_thread.run_sync(blocking_handler)
+
+    try:
+        return await drive(handler, args.requests, args.concurrency)
+    finally:
+        engine.dispose()
+
+async def run_async_mode(url, args):
+    async_url = to_async_url(url)
+    engine = create_async_engine(async_url, pool_size=args.pool_size, max_overflow=0, pool_timeout=60)
+    if url.startswith("sqlite"):
+        install_sqlite_sleep(engine.sync_engine)
+    statement = sleep_statement(url, args.latency_ms)
+
+    async def handler():
+        async with AsyncSession(engine) as session:
+            (await session.exec(statement)).all()
+
+    try:
+        return await drive(handler, args.requests, args.concurrency)
+    finally:
+        await engine.dispose()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None, help="Sync database URL (defaults to settings.database_url)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=20, help="Simulated time each query spends in the database")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url is None:
+        from App.config import settings
+        url = settings.database_url
+
+    results = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "pool_size": args.pool_size,
+            "latency_ms": args.latency_ms,
+            "database": url.split("@")[-1],
+        },
+        "sync_threadpool": await run_sync_mode(url, args),
+        "async_session": await run_async_mode(url, args),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
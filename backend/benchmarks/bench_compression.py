@@ -0,0 +1,121 @@
+"""CPU cost vs bytes saved when compressing trip payloads.
+
+Builds JSON bodies shaped like GET /trips/ (a list of TripRead with nested
+stops and activities) and GET /trips/{id} (one TripRead), then compresses
+each with the same compressor classes CompressionMiddleware uses, at several
+gzip levels and Brotli qualities. Reported per payload and setting: output
+size, ratio, and compress time (median of --repeat runs).
+
+Usage (from backend/):
+    python -m benchmarks.bench_compression
+    python -m benchmarks.bench_compression --trips 200 --stops 6 --activities 8 --repeat 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from App.compression import BrotliCompressor, GzipCompressor
+
+SETTINGS = [
+    ("gzip", 1), ("gzip", 6), ("gzip", 9),
+    ("br", 1), ("br", 4), ("br", 6), ("br", 11),
+]
+
+CITIES = ["Goa", "Paris", "Rome", "Tokyo", "Lisbon", "Hanoi", "Cusco", "Reykjavik", "Cape Town", "Kyoto"]
+CATEGORIES = ["Transport", "Stay", "Food", "Activity", "Other"]
+WORDS = "museum tour dinner walk ferry market temple hike beach sunset cafe gallery train flight hotel".split()
+
+def make_trip(rng: random.Random, trip_id: int, stops: int, activities: int) -> dict:
+    start = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    trip_stops = []
+    for order in range(stops):
+        city_id = rng.randrange(len(CITIES))
+        arrival = start + timedelta(days=order * 2)
+        trip_stops.append({
+            "id": trip_id * 100 + order,
+            "city": {"id": city_id + 1, "name": CITIES[city_id], "country": "Unknown", "image_url": None},
+            "arrival_date": arrival.isoformat(),
+            "departure_date": (arrival + timedelta(days=2)).isoformat(),
+            "order_index": order,
+            "activities": [
+                {
+                    "id": trip_id * 10000 + order * 100 + n,
+                    "title": " ".join(rng.sample(WORDS, 3)).title(),
+                    "description": " ".join(rng.choices(WORDS, k=rng.randrange(0, 20))) or None,
+                    "category": rng.choice(CATEGORIES),
+                    "cost": round(rng.uniform(0, 300), 2),
+                    "activity_date": arrival.isoformat(),
+                    "start_time": f"{rng.randrange(24):02d}:{rng.choice(['00', '30'])}:00",
+                    "is_completed": rng.random() < 0.3,
+                }
+                for n in range(activities)
+            ],
+        })
+    return {
+        "id": trip_id,
+        "title": f"Trip to {trip_stops[0]['city']['name'] if trip_stops else 'Nowhere'}",
+        "description": " ".join(rng.choices(WORDS, k=12)),
+        "destination_cache": ", ".join(s["city"]["name"] for s in trip_stops),
+        "cover_image_url": None,
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=stops * 2)).isoformat(),
+        "budget_limit": 2000.0,
+        "travelers": rng.randrange(1, 5),
+        "status": "Planning",
+        "is_public": False,
+        "created_at": datetime(2025, 1, 1).isoformat(),
+        "owner_id": 1,
+        "stops": trip_stops,
+        "total_spent": round(sum(a["cost"] for s in trip_stops for a in s["activities"]), 2),
+    }
+
+def compress_once(encoding: str, level: int, body: bytes) -> bytes:
+    compressor = BrotliCompressor(level) if encoding == "br" else GzipCompressor(level)
+    return compressor.compress(body, final=True)
+
+def measure(encoding: str, level: int, body: bytes, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = compress_once(encoding, level, body)
+        timings.append((time.perf_counter() - started) * 1000)
+    ms = statistics.median(timings)
+    return {
+        "encoding": encoding,
+        "level": level,
+        "bytes": len(out),
+        "ratio": round(len(body) / len(out), 2),
+        "saved_pct": round(100 * (1 - len(out) / len(body)), 1),
+        "compress_ms": round(ms, 3),
+        "mb_per_s": round(len(body) / 1e6 / (ms / 1000), 1) if ms else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trips", type=int, default=100, help="Trips in the list payload")
+    parser.add_argument("--stops", type=int, default=5, help="Stops per trip")
+    parser.add_argument("--activities", type=int, default=6, help="Activities per stop")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    trips = [make_trip(rng, i + 1, args.stops, args.activities) for i in range(args.trips)]
+    payloads = {
+        "trip_list": json.dumps(trips).encode(),
+        "trip_detail": json.dumps(trips[0]).encode(),
+    }
+
+    results = {}
+    for name, body in payloads.items():
+        results[name] = {
+            "raw_bytes": len(body),
+            "settings": [measure(encoding, level, body, args.repeat) for encoding, level in SETTINGS],
+        }
+    print(json.dumps({"params": vars(args), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
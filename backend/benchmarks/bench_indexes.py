@@ -0,0 +1,179 @@
+"""Query plans and timings of the trip list hot path, without vs with the
+migration-3 indexes.
+
+Seeds a scratch database through the real migrations, then runs the statements
+GET /trips/ issues for one user -- the trip page plus the selectinload queries
+for stops (+ cities) and activities -- captured from the driver as executed.
+Each statement is EXPLAINed (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on
+Postgres) and timed on its own at the driver; the whole request (ORM included)
+is timed too. Timings are medians of --repeat runs. Everything is measured
+first at schema version 2 (migration 3 reverted), then at the latest version.
+
+The database is DROPPED and recreated: point --database-url at a scratch
+database only.
+
+Usage (from backend/):
+    python -m benchmarks.bench_indexes
+    python -m benchmarks.bench_indexes --users 500 --trips 40 --stops 6 --activities 5 --repeat 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, text
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, create_engine, select
+
+from App.migrations import drop_schema, migrate
+from App.models import Activity, City, ExpenseCategory, ItineraryStop, Trip, User
+
+HOT_PATH_MIGRATION = 3 # "Hot-path indexes" in App/migrations.py
+CITIES = ["Goa", "Paris", "Rome", "Tokyo", "Lisbon", "Hanoi", "Cusco", "Kyoto", "Oslo", "Lima"]
+BATCH = 5000
+
+def insert_batched(conn, table, rows):
+    for start in range(0, len(rows), BATCH):
+        conn.execute(insert(table), rows[start:start + BATCH])
+
+def seed(engine, args):
+    rng = random.Random(args.seed)
+    base = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        insert_batched(conn, City.__table__, [
+            {"id": i + 1, "name": f"{name} {i}", "country": "Unknown"} for i, name in enumerate(CITIES * 20)
+        ])
+        insert_batched(conn, User.__table__, [
+            {"id": u + 1, "name": f"User {u}", "username": f"user{u}", "email": f"user{u}@example.com", "hashed_password": "x"}
+            for u in range(args.users)
+        ])
+        trips, stops, activities = [], [], []
+        trip_id = stop_id = activity_id = 0
+        for user_id in range(1, args.users + 1):
+            for _ in range(args.trips):
+                trip_id += 1
+                trips.append({
+                    "id": trip_id, "title": f"Trip {trip_id}", "owner_id": user_id, "budget_limit": 0.0,
+                    "travelers": 1, "status": "PLANNING", "is_public": rng.random() < 0.1, "version": 1, "view_count": 0,
+                    "created_at": base + timedelta(minutes=rng.randrange(500_000)),
+                })
+                for order in rng.sample(range(args.stops), args.stops):
+                    stop_id += 1
+                    stops.append({"id": stop_id, "trip_id": trip_id, "city_id": rng.randrange(1, 201), "order_index": order})
+                    for _ in range(args.activities):
+                        activity_id += 1
+                        activities.append({
+                            "id": activity_id, "stop_id": stop_id, "title": f"Activity {activity_id}",
+                            "category": rng.choice(list(ExpenseCategory)).name, "cost": 10.0, "is_completed": False,
+                        })
+        # Interleave owners the way real signups would
+        rng.shuffle(trips)
+        insert_batched(conn, Trip.__table__, trips)
+        insert_batched(conn, ItineraryStop.__table__, stops)
+        insert_batched(conn, Activity.__table__, activities)
+    return {"trips": len(trips), "stops": len(stops), "activities": len(activities)}
+
+def my_trips_statement(user_id: int, page_size: int):
+    # What get_my_trips runs for ?limit=page_size (full view)
+    return (
+        select(Trip).where(Trip.owner_id == user_id)
+        .order_by(Trip.created_at.desc(), Trip.id.desc())
+        .limit(page_size + 1)
+        .options(
+            selectinload(Trip.stops).selectinload(ItineraryStop.city),
+            selectinload(Trip.stops).selectinload(ItineraryStop.activities)
+        )
+    )
+
+def capture(engine, statement):
+    captured = []
+
+    def record(conn, cursor, sql, params, context, executemany):
+        captured.append((sql, params))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with Session(engine) as session:
+            session.exec(statement).all()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return captured
+
+def explain(engine, sql, params):
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + sql, params).all()
+    # SQLite: (id, parent, notused, detail); Postgres: one text column
+    return [row[-1] for row in rows]
+
+def time_query(engine, sql, params, repeat: int) -> float:
+    samples = []
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.exec_driver_sql(sql, params).all()
+            samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+def time_request(engine, statement, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        with Session(engine) as session:
+            started = time.perf_counter()
+            session.exec(statement).all()
+            samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+def measure(engine, statement, repeat: int) -> dict:
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    queries = [
+        {
+            "sql": " ".join(sql.split())[:160],
+            "plan": explain(engine, sql, params),
+            "query_ms": time_query(engine, sql, params, repeat),
+        }
+        for sql, params in capture(engine, statement)
+    ]
+    return {"request_ms": time_request(engine, statement, repeat), "queries": queries}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///bench_indexes.db", help="Scratch database; it is wiped")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--trips", type=int, default=50, help="Trips per user")
+    parser.add_argument("--stops", type=int, default=5, help="Stops per trip")
+    parser.add_argument("--activities", type=int, default=4, help="Activities per stop")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    quiet = lambda message: None
+    try:
+        with engine.begin() as conn:
+            drop_schema(conn)
+        migrate(engine, log=quiet)
+        rows = seed(engine, args)
+        statement = my_trips_statement(random.Random(args.seed).randrange(1, args.users + 1), args.page_size)
+
+        migrate(engine, HOT_PATH_MIGRATION - 1, log=quiet)
+        before = measure(engine, statement, args.repeat)
+        migrate(engine, log=quiet)
+        after = measure(engine, statement, args.repeat)
+    finally:
+        engine.dispose()
+
+    print(json.dumps({
+        "params": {**vars(args), "database_url": args.database_url.split("@")[-1]},
+        "rows": rows,
+        "without_indexes": before,
+        "with_indexes": after,
+        "speedup": round(before["request_ms"] / after["request_ms"], 1) if after["request_ms"] else None,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
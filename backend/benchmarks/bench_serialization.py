@@ -0,0 +1,147 @@
+"""Old vs new rendering of TripRead responses.
+
+"pydantic" is what GET /trips/ and GET /trips/{id} used to do: model_dump()
+of the trip, every stop, city and activity, TripRead(**dict), then FastAPI's
+response_model pass (validate again, dump to JSON-able python, json.dumps).
+"single_pass" is serializers.TripSerializer: attribute reads into dicts and
+one orjson.dumps.
+
+Both run on the same in-memory ORM objects (no database), for several
+activities-per-stop counts. The outputs are checked for equality first.
+Per-trip and per-activity costs come from a least-squares fit of total time
+against the trip and activity counts.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --trips 200 --stops 5 --activities 0 4 16 --repeat 10
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+
+from App.models import Activity, City, ExpenseCategory, ItineraryStop, Trip
+from App.routers.trips import TripRead, trip_serializer
+
+CITIES = ["Goa", "Paris", "Rome", "Tokyo", "Lisbon", "Hanoi", "Cusco", "Kyoto"]
+WORDS = "museum tour dinner walk ferry market temple hike beach sunset cafe gallery train".split()
+
+def make_trips(rng: random.Random, trips: int, stops: int, activities: int) -> List[Trip]:
+    cities = [City(id=i + 1, name=name, country="Unknown") for i, name in enumerate(CITIES)]
+    result = []
+    next_id = 1
+    for t in range(trips):
+        start = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        trip = Trip(
+            id=t + 1, title=f"Trip {t}", description=" ".join(rng.choices(WORDS, k=10)),
+            destination_cache=rng.choice(CITIES), start_date=start, end_date=start + timedelta(days=10),
+            budget_limit=1500.0, owner_id=1, created_at=datetime(2025, 1, 1, 12, 0, t % 60),
+        )
+        for order in range(stops):
+            city = rng.choice(cities)
+            stop = ItineraryStop(id=next_id, trip_id=trip.id, city_id=city.id, order_index=order, arrival_date=start)
+            stop.city = city
+            next_id += 1
+            stop.activities = [
+                Activity(
+                    id=next_id + n, stop_id=stop.id, title=" ".join(rng.sample(WORDS, 3)),
+                    description=" ".join(rng.choices(WORDS, k=rng.randrange(0, 12))) or None,
+                    category=rng.choice(list(ExpenseCategory)), cost=round(rng.uniform(0, 200), 2),
+                    activity_date=start,
+                )
+                for n in range(activities)
+            ]
+            next_id += activities
+            trip.stops.append(stop)
+        result.append(trip)
+    return result
+
+def pydantic_path(trips: List[Trip], totals: dict, adapter: TypeAdapter) -> bytes:
+    trip_reads = []
+    for trip in trips:
+        trip_dict = trip.model_dump()
+        trip_dict["stops"] = [
+            {
+                **stop.model_dump(),
+                "city": stop.city.model_dump(),
+                "activities": [act.model_dump() for act in stop.activities],
+            }
+            for stop in trip.stops
+        ]
+        trip_dict["total_spent"] = totals.get(trip.id, 0.0)
+        trip_reads.append(TripRead(**trip_dict))
+    # FastAPI's response_model handling: validate, dump, json.dumps
+    validated = adapter.validate_python(trip_reads, from_attributes=True)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+def single_pass(trips: List[Trip], totals: dict) -> bytes:
+    return trip_serializer.render_many(trips, totals)
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+def fit_costs(rows, key: str) -> dict:
+    # time_ms ~= a * trips + b * activities (least squares, no intercept)
+    tt = sum(r["trips"] ** 2 for r in rows)
+    ta = sum(r["trips"] * r["activities"] for r in rows)
+    aa = sum(r["activities"] ** 2 for r in rows)
+    ty = sum(r["trips"] * r[key] for r in rows)
+    ay = sum(r["activities"] * r[key] for r in rows)
+    det = tt * aa - ta * ta
+    if not det:
+        return {"per_trip_us": round(1000 * ty / tt, 2) if tt else None, "per_activity_us": None}
+    return {
+        "per_trip_us": round(1000 * (ty * aa - ay * ta) / det, 2),
+        "per_activity_us": round(1000 * (tt * ay - ta * ty) / det, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trips", type=int, default=100)
+    parser.add_argument("--stops", type=int, default=5)
+    parser.add_argument("--activities", type=int, nargs="+", default=[0, 4, 16], help="Activities per stop, one run each")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[TripRead])
+    rows = []
+    for activities in args.activities:
+        trips = make_trips(random.Random(args.seed), args.trips, args.stops, activities)
+        totals = {trip.id: 100.0 for trip in trips}
+
+        expected = json.loads(pydantic_path(trips, totals, adapter))
+        assert json.loads(single_pass(trips, totals)) == expected, "serializers disagree"
+
+        old_ms = timed(lambda: pydantic_path(trips, totals, adapter), args.repeat)
+        new_ms = timed(lambda: single_pass(trips, totals), args.repeat)
+        rows.append({
+            "trips": args.trips,
+            "stops": args.trips * args.stops,
+            "activities": args.trips * args.stops * activities,
+            "bytes": len(single_pass(trips, totals)),
+            "pydantic_ms": round(old_ms, 2),
+            "single_pass_ms": round(new_ms, 2),
+            "speedup": round(old_ms / new_ms, 1) if new_ms else None,
+        })
+
+    print(json.dumps({
+        "params": vars(args),
+        "runs": rows,
+        "pydantic": fit_costs(rows, "pydantic_ms"),
+        "single_pass": fit_costs(rows, "single_pass_ms"),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
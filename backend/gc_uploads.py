@@ -0,0 +1,62 @@
+from App.database import async_engine, create_db_and_table
+from sqlmodel.ext.asyncio.session import AsyncSession
+from App.storage import blobs_to_keep, find_drift, forget_unreferenced, recount, sweep_files
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import sys
+import time
+
+async def collect(grace_hours: float, dry_run: bool):
+    # Same moment twice: naive UTC for the table, epoch seconds for file mtimes
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    cutoff_mtime = time.time() - grace_hours * 3600
+
+    async with AsyncSession(async_engine) as session:
+        print("Checking upload reference counts...")
+        drift = await find_drift(session)
+        for row in drift:
+            print(f"  DRIFT {row['name']}: expected {row['expected']}, stored {row['actual']}")
+        print(f"{len(drift)} drifted reference count(s) found.")
+        if not dry_run:
+            await recount(session, drift)
+            await session.commit()
+
+        keep = await blobs_to_keep(session, cutoff)
+        if dry_run:
+            # Counts were not fixed: trust the columns for what to keep
+            keep += [row["name"] for row in drift if row["expected"] > 0]
+
+        print(f"Sweeping files unreferenced for more than {grace_hours}h...")
+        removed = sweep_files(keep, cutoff_mtime, dry_run=dry_run)
+        for name in removed:
+            print(f"  {'would remove' if dry_run else 'removed'} {name}")
+
+        if not dry_run:
+            forgotten = await forget_unreferenced(session, cutoff)
+            await session.commit()
+            print(f"{forgotten} unreferenced blob row(s) dropped.")
+
+    print(f"{len(removed)} file(s) {'to remove' if dry_run else 'removed'}.")
+    return 0
+
+async def run(grace_hours: float, dry_run: bool):
+    try:
+        return await collect(grace_hours, dry_run)
+    finally:
+        # Close pooled connections, otherwise the driver threads keep us alive
+        await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Recount upload references and delete orphaned files in App/uploads")
+    parser.add_argument("--grace-hours", type=float, default=24.0, help="Only delete files untouched for this long (default 24)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report, do not change anything")
+    args = parser.parse_args()
+
+    # Make sure the StoredBlob table exists on databases created before it
+    create_db_and_table()
+
+    sys.exit(asyncio.run(run(args.grace_hours, args.dry_run)))
+
+if __name__ == "__main__":
+    main()
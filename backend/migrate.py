@@ -0,0 +1,31 @@
+from App.database import engine
+from App.migrations import MIGRATIONS, current_version, latest_version, migrate
+import argparse
+import sys
+
+def show_status():
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for step in MIGRATIONS:
+        mark = "x" if step.version <= version else " "
+        print(f"  [{mark}] {step.version}: {step.description}")
+    print(f"Database at version {version}, latest is {latest_version()}.")
+    return 0 if version == latest_version() else 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply (or revert) versioned schema migrations")
+    parser.add_argument("--status", action="store_true", help="Only list migrations and the database version")
+    parser.add_argument("--to", type=int, default=None, help="Target version (default: latest); lower reverts")
+    args = parser.parse_args()
+
+    try:
+        if args.status:
+            return show_status()
+        version = migrate(engine, args.to)
+        print(f"Database at version {version}.")
+        return 0
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+from App.database import async_engine, create_db_and_table
+from sqlmodel.ext.asyncio.session import AsyncSession
+from App.rollups import find_drift, rebuild_rollups
+import argparse
+import asyncio
+import sys
+
+async def report_drift(session):
+    drift = await find_drift(session)
+    for row in drift:
+        where = f"trip {row['trip_id']}"
+        if row["stop_id"] is not None:
+            where += f" / stop {row['stop_id']} / {row['category']}"
+        print(f"  DRIFT {where}: expected {row['expected']}, stored {row['actual']}")
+    return drift
+
+async def check_and_rebuild(verify: bool):
+    async with AsyncSession(async_engine) as session:
+        print("Checking rollups against Activity rows...")
+        drift = await report_drift(session)
+        print(f"{len(drift)} drifted rollup row(s) found.")
+
+        if verify:
+            return 1 if drift else 0
+
+        print("Rebuilding rollups...")
+        await rebuild_rollups(session)
+        await session.commit()
+
+        remaining = await report_drift(session)
+        if remaining:
+            print("Rollups still drift after rebuild!")
+            return 1
+
+    print("Rollup rebuild complete.")
+    return 0
+
+async def run(verify: bool):
+    try:
+        return await check_and_rebuild(verify)
+    finally:
+        # Close pooled connections, otherwise the driver threads keep us alive
+        await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or verify the trip spend rollups")
+    parser.add_argument("--verify", action="store_true", help="Only report drift, do not rewrite the rollups")
+    args = parser.parse_args()
+
+    # Make sure the rollup tables exist on databases created before them
+    create_db_and_table()
+
+    sys.exit(asyncio.run(run(args.verify)))
+
+if __name__ == "__main__":
+    main()
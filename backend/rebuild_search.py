@@ -0,0 +1,37 @@
+from App.database import async_engine, create_db_and_table
+from sqlmodel.ext.asyncio.session import AsyncSession
+from App.search import rebuild_search_index
+import argparse
+import asyncio
+import sys
+
+async def rebuild(batch_size: int):
+    async with AsyncSession(async_engine) as session:
+        print("Rebuilding search documents...")
+        counts = await rebuild_search_index(session, batch_size)
+        await session.commit()
+
+    for name, count in counts.items():
+        print(f"  {count} {name}")
+    print("Search rebuild complete.")
+    return 0
+
+async def run(batch_size: int):
+    try:
+        return await rebuild(batch_size)
+    finally:
+        # Close pooled connections, otherwise the driver threads keep us alive
+        await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the full-text search index from trips, stops and activities")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows read and indexed per round trip")
+    args = parser.parse_args()
+
+    # Creates the search table on databases that predate it
+    create_db_and_table()
+
+    sys.exit(asyncio.run(run(args.batch_size)))
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 from App.database import engine, create_db_and_table
-from sqlmodel import SQLModel, Session
+from App.migrations import drop_schema
+from sqlmodel import Session
 from App.models import User
 from App.utils import hash_password
 
 def reset_database():
     print("Resetting database...")
     print("Dropping all tables...")
-    SQLModel.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        drop_schema(conn)
     
-    print("Creating tables...")
+    print("Running migrations...")
     create_db_and_table()
     
     print("Seeding test user...")
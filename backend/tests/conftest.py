@@ -0,0 +1,71 @@
+import itertools
+import os
+import tempfile
+
+import pytest
+
+# Settings are read when App is imported: a scratch SQLite database and cheap
+# password hashing, whatever .env says
+_scratch = tempfile.mkdtemp(prefix="app-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["PASSWORD_HASH_EXECUTOR"] = "thread"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from App.database import create_db_and_table  # noqa: E402
+from App.main import app  # noqa: E402
+
+PASSWORD = "test-password"
+_users = itertools.count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    create_db_and_table()
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def make_user(client):
+    """Register a new user; returns their Authorization header."""
+    def make() -> dict:
+        n = next(_users)
+        email = f"user{n}@example.com"
+        response = client.post("/register", data={
+            "name": f"User {n}", "username": f"user{n}", "email": email, "password": PASSWORD,
+        })
+        assert response.status_code < 300, response.text
+        response = client.post("/login", data={"username": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return make
+
+@pytest.fixture
+def auth(make_user) -> dict:
+    return make_user()
+
+def trip_payload(stops=("Paris", "Rome")) -> dict:
+    return {
+        "destination": stops[0],
+        "start_date": "2025-06-01",
+        "end_date": "2025-06-10",
+        "travelers": 2,
+        "budget": 2500.0,
+        "stops": list(stops),
+    }
+
+@pytest.fixture
+def make_trip(client, auth):
+    """Create a trip for `auth`'s user; returns the trip with its stops."""
+    def make(stops=("Paris", "Rome")) -> dict:
+        response = client.post("/trips/", json=trip_payload(stops), headers=auth)
+        assert response.status_code == 200, response.text
+        response = client.get(f"/trips/{response.json()['id']}", headers=auth)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
+
+@pytest.fixture
+def trip(make_trip) -> dict:
+    return make_trip()
@@ -0,0 +1,50 @@
+from sqlalchemy import create_engine, select
+from sqlmodel import SQLModel
+
+from App.migrations import migrate
+
+def stop_cities(trip: dict) -> list:
+    return [(stop["city"]["id"], stop["city"]["name"]) for stop in trip["stops"]]
+
+def test_non_ascii_capitals_resolve_to_one_city(client, auth, make_trip):
+    # SQLite's lower() leaves É, Ó, Ü alone; the keys are folded in Python
+    evora = make_trip(("Évora",))
+    assert [name for _, name in stop_cities(evora)] == ["Évora"]
+    assert stop_cities(make_trip(("évora",))) == stop_cities(evora)
+
+    (first, first_name), (second, _) = stop_cities(make_trip(("Óbidos", "ÓBIDOS")))
+    assert first == second and first_name == "Óbidos"
+
+    response = client.post(f"/trips/{evora['id']}/stops", json={"city_name": "Ürümqi"}, headers=auth)
+    assert response.status_code == 200, response.text
+    again = client.post(f"/trips/{evora['id']}/stops", json={"city_name": "ürümqi", "order_index": 1}, headers=auth)
+    assert again.json()["city_id"] == response.json()["city_id"]
+
+def test_blank_city_name(client, auth, trip):
+    response = client.post(f"/trips/{trip['id']}/stops", json={"city_name": "  "}, headers=auth)
+    assert response.status_code == 400
+
+def test_migration_merges_on_city_key(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    try:
+        migrate(engine, target=4, log=lambda message: None)
+        with engine.begin() as conn:
+            # Raw inserts: the tables as step 4 left them, without name_key
+            conn.exec_driver_sql(
+                "INSERT INTO city (id, name, country) VALUES "
+                "(1, 'Évora', 'PT'), (2, 'ÉVORA', 'PT'), (3, 'évora', 'PT'), (4, 'Paris', 'FR'), (5, 'paris', 'FR')"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO itinerarystop (id, trip_id, city_id, order_index) VALUES (1, 1, 3, 0), (2, 1, 5, 1)"
+            )
+        migrate(engine, log=lambda message: None)
+
+        city = SQLModel.metadata.tables["city"]
+        stop = SQLModel.metadata.tables["itinerarystop"]
+        with engine.connect() as conn:
+            assert conn.execute(select(city.c.id, city.c.name_key).order_by(city.c.id)).all() == [
+                (1, "évora"), (4, "paris"),
+            ]
+            assert conn.execute(select(stop.c.city_id).order_by(stop.c.id)).scalars().all() == [1, 4]
+    finally:
+        engine.dispose()
@@ -0,0 +1,62 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from App import city_index as module
+from App.city_index import CityIndex
+from App.config import settings
+from App.database import engine
+from App.models import City, ItineraryStop
+
+def names(index, query, limit=10):
+    return [match.entry.name for match in index.search(query, limit)]
+
+def test_added_cities_are_found_before_and_after_merge(monkeypatch):
+    monkeypatch.setattr(module, "MAX_PENDING", 3)
+    index = CityIndex()
+    for city_id, name in enumerate(["Sevilla", "Salamanca", "Segovia", "Santander", "Soria"], start=1):
+        index.add(city_id, name, "ES", usage=city_id)
+    # Three were merged into the main array, two are still pending
+    assert len(index._keys) == 3 and len(index._pending_keys) == 2
+
+    assert names(index, "s") == ["Soria", "Santander", "Segovia", "Salamanca", "Sevilla"]
+    assert names(index, "sa") == ["Santander", "Salamanca"]
+    assert names(index, "sorai") == ["Soria"] # Fuzzy
+
+    index._merge_pending()
+    assert index._keys == sorted(index._keys) and not index._pending_keys
+    assert names(index, "sa") == ["Santander", "Salamanca"]
+
+def add_stops_elsewhere(trip_id: int):
+    """Stops (and a city) written by another worker."""
+    with Session(engine) as session:
+        zurich = session.exec(select(City).where(City.name == "Zurich")).one()
+        zug = City(name="Zug", name_key="zug", country="CH")
+        session.add(zug)
+        session.flush()
+        session.add_all([ItineraryStop(trip_id=trip_id, city_id=city.id) for city in (zurich, zurich, zug)])
+        session.commit()
+
+def test_refresh_reloads_usage(client, make_trip):
+    trip = make_trip(("Zermatt", "Zurich"))
+    index = CityIndex()
+
+    async def scenario():
+        # Own engine: the app's pool belongs to the TestClient's event loop
+        index_engine = create_async_engine(settings.resolved_async_database_url)
+        try:
+            async with AsyncSession(index_engine) as session:
+                await index.load(session)
+            loaded = [(m.entry.name, m.entry.usage) for m in index.search("z")]
+            add_stops_elsewhere(trip["id"])
+            async with AsyncSession(index_engine) as session:
+                await index.refresh(session)
+            return loaded
+        finally:
+            await index_engine.dispose()
+
+    # Equal usage: shorter name first
+    assert asyncio.run(scenario()) == [("Zurich", 1), ("Zermatt", 1)]
+    assert [(m.entry.name, m.entry.usage) for m in index.search("z")] == [("Zurich", 3), ("Zug", 1), ("Zermatt", 1)]
@@ -0,0 +1,19 @@
+import json
+
+def test_streaming_export_is_compressed(client, auth, make_trip):
+    for _ in range(20):
+        make_trip(("Marrakesh", "Fes", "Essaouira"))
+    response = client.get(
+        "/trips/export", params={"format": "ndjson"}, headers={**auth, "Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers # Streamed
+    # Decoded by the client
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len([r for r in records if r["type"] == "trip"]) == 20
+
+def test_small_response_is_not_compressed(client, auth):
+    response = client.get("/trips/", headers={**auth, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
@@ -0,0 +1,68 @@
+import json
+
+from App import exporter
+
+def add_activity(client, auth, stop_id, **activity):
+    response = client.post(f"/trips/stops/{stop_id}/activities", json=activity, headers=auth)
+    assert response.status_code == 200, response.text
+
+def export_ndjson(client, auth) -> list:
+    response = client.get("/trips/export", params={"format": "ndjson"}, headers=auth)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def outline(records, trip_id) -> list:
+    """A trip's records without ids and timestamps, in export order."""
+    current, out = None, []
+    for record in records:
+        if record["type"] == "trip":
+            current = record["trip_id"]
+        if current == trip_id:
+            out.append({k: v for k, v in record.items() if not k.endswith("id") and k != "created_at"})
+    return out
+
+def test_ndjson_export_round_trip(client, auth, make_trip, monkeypatch):
+    # Small flushes: records must not be split or lost across chunks
+    monkeypatch.setattr(exporter, "FLUSH_BYTES", 64)
+    trip = make_trip(("Lisbon", "Porto", "Faro"))
+    lisbon, porto, _ = (stop["id"] for stop in trip["stops"])
+    add_activity(client, auth, lisbon, title="Tram 28", category="Transport", cost=3.0)
+    add_activity(client, auth, lisbon, title="Pastéis", description='"Belém"\nbakery', category="Food", cost=4.5)
+    add_activity(client, auth, porto, title="Port cellar", category="Activity", cost=25.0)
+
+    records = export_ndjson(client, auth)
+    assert [(r["type"], r.get("city") or r.get("activity_title") or r["trip_title"]) for r in records] == [
+        ("trip", "Trip to Lisbon"),
+        ("stop", "Lisbon"), ("activity", "Tram 28"), ("activity", "Pastéis"),
+        ("stop", "Porto"), ("activity", "Port cellar"),
+        ("stop", "Faro"),
+    ]
+    assert records[3]["activity_description"] == '"Belém"\nbakery'
+    assert all(r["trip_id"] == trip["id"] for r in records if r["type"] in ("trip", "stop"))
+
+    # Feed the activity lines back through the NDJSON import into a copy of
+    # the trip: same activities, same totals
+    copy = make_trip(("Lisbon", "Porto", "Faro"))
+    stop_map = dict(zip((stop["id"] for stop in trip["stops"]), (stop["id"] for stop in copy["stops"])))
+    lines = [
+        json.dumps({
+            "stop_id": stop_map[r["stop_id"]],
+            "title": r["activity_title"],
+            "description": r["activity_description"],
+            "category": r["category"],
+            "cost": r["cost"],
+        })
+        for r in records if r["type"] == "activity"
+    ]
+    response = client.post(
+        f"/trips/{copy['id']}/activities/import", content="\n".join(lines).encode(),
+        headers={**auth, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.json()["imported"] == 3
+
+    original = client.get(f"/trips/{trip['id']}/stats", headers=auth).json()
+    copied = client.get(f"/trips/{copy['id']}/stats", headers=auth).json()
+    assert copied["total_spent"] == original["total_spent"] == 32.5
+    records = export_ndjson(client, auth)
+    assert outline(records, copy["id"]) == outline(records, trip["id"])
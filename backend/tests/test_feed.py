@@ -0,0 +1,56 @@
+import asyncio
+
+from App.feed import FeedCache, FeedPage, LocalCacheBackend
+
+def public_ids(client, **params) -> list:
+    response = client.get("/trips/public", params={"limit": 200, **params})
+    assert response.status_code == 200, response.text
+    return [trip["id"] for trip in response.json()]
+
+def test_publishing_a_trip_updates_the_feed(client, auth, make_user, trip):
+    assert trip["id"] not in public_ids(client)
+
+    response = client.patch(f"/trips/{trip['id']}", json={"is_public": True, "title": "Slow travel"}, headers=auth)
+    assert response.status_code == 200, response.text
+    assert response.json()["is_public"] is True and response.json()["title"] == "Slow travel"
+    assert trip["id"] in public_ids(client)
+    # Others may read it now
+    assert client.get(f"/trips/{trip['id']}", headers=make_user()).status_code == 200
+
+    # Cached pages that listed it go away with it
+    client.patch(f"/trips/{trip['id']}", json={"is_public": False}, headers=auth)
+    assert trip["id"] not in public_ids(client)
+
+def test_city_filter_with_non_ascii_capital(client, auth, make_trip):
+    trip = make_trip(("Évora", "Lisbon"))
+    client.patch(f"/trips/{trip['id']}", json={"is_public": True}, headers=auth)
+    assert trip["id"] in public_ids(client, city="Évora")
+    assert trip["id"] in public_ids(client, city="ÉVORA")
+    assert trip["id"] not in public_ids(client, city="Óbidos")
+
+def test_only_the_owner_updates(client, make_user, trip):
+    response = client.patch(f"/trips/{trip['id']}", json={"is_public": True}, headers=make_user())
+    assert response.status_code == 403
+
+def test_waiters_rebuild_after_cancelled_builder():
+    cache = FeedCache(LocalCacheBackend(10, 60))
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.05)
+        return FeedPage(b"[]", None)
+
+    async def scenario():
+        builder = asyncio.create_task(cache.get_or_build("page", build))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_build("page", build)) for _ in range(3)]
+        await asyncio.sleep(0)
+        builder.cancel()
+        return await asyncio.gather(*waiters), builder
+
+    pages, builder = asyncio.run(scenario())
+    assert builder.cancelled()
+    assert [page.body for page in pages] == [b"[]"] * 3
+    # One cancelled build, then exactly one more for all the waiters
+    assert len(builds) == 2
@@ -0,0 +1,47 @@
+import asyncio
+
+from App.importer import iter_csv_rows
+
+CSV = (
+    'title,description,category,cost\r\n'
+    'Louvre,"Tickets at the\r\npyramid, not the ""carrousel""",Activity,17\r\n'
+    'Dinner,,Food,42.5\r\n'
+)
+
+def parse(body: bytes, chunk_size: int) -> list:
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    async def collect():
+        return [row async for row in iter_csv_rows(chunks())]
+    return asyncio.run(collect())
+
+def test_csv_quoted_newline_in_any_chunking():
+    expected = [
+        (1, {"title": "Louvre", "description": 'Tickets at the\npyramid, not the "carrousel"',
+             "category": "Activity", "cost": "17"}),
+        (2, {"title": "Dinner", "category": "Food", "cost": "42.5"}),
+    ]
+    body = CSV.encode()
+    for chunk_size in (1, 7, len(body)):
+        assert parse(body, chunk_size) == expected
+
+def test_csv_unterminated_quote():
+    rows = parse(b'title,description\nLouvre,"never closed\nstill open\n', 5)
+    assert rows == [(1, "Unterminated quoted field")]
+
+def test_import_csv_with_multiline_field(client, auth, trip):
+    stop_id = trip["stops"][0]["id"]
+    response = client.post(
+        f"/trips/stops/{stop_id}/activities/import", content=CSV.encode(),
+        headers={**auth, "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert response.json()["failed"] == 0
+
+    details = client.get(f"/trips/{trip['id']}", headers=auth).json()
+    descriptions = {a["title"]: a["description"] for a in details["stops"][0]["activities"]}
+    assert descriptions == {"Louvre": 'Tickets at the\npyramid, not the "carrousel"', "Dinner": None}
+    assert details["total_spent"] == 59.5
@@ -0,0 +1,45 @@
+# Statement budgets for the hot endpoints (see query_inspector.py). A
+# failure prints every statement shape the request ran: an N+1 shows up as
+# one shape with a count per row.
+from App.query_inspector import assert_query_budget, query_budget
+
+def test_list_trips(client, auth, make_trip):
+    for _ in range(3):
+        make_trip()
+    # Trips, stops, cities, activities (selectinload), spend totals; not per trip
+    response = assert_query_budget(client, "GET", "/trips/", max_statements=5, max_repeats=1, headers=auth)
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+def test_trip_details(client, auth, trip):
+    # Version check, trip, stops, cities, activities, spend total
+    response = assert_query_budget(
+        client, "GET", f"/trips/{trip['id']}", max_statements=6, max_repeats=1, headers=auth
+    )
+    assert response.status_code == 200
+    assert [stop["city"]["name"] for stop in response.json()["stops"]] == ["Paris", "Rome"]
+
+def test_create_trip(client, auth):
+    stops = [f"Budget City {n}" for n in range(20)]
+    payload = {"destination": "Anywhere", "start_date": "2025-06-01", "end_date": "2025-06-10", "stops": stops}
+    with query_budget(27) as log:
+        response = client.post("/trips/", json=payload, headers=auth)
+    assert response.status_code == 200
+
+    # SQLite hands back generated ids one INSERT at a time (no insertmanyvalues
+    # sentinel), so the stop INSERT is the only shape that may repeat. City
+    # lookups and creation must stay one statement each, whatever the count.
+    stop_inserts = [shape for shape in log.shapes() if shape.startswith("INSERT INTO itinerarystop")]
+    repeated = [shape for shape, count in log.repeated(3) if shape not in stop_inserts]
+    assert not repeated, log.describe()
+
+def test_add_activity(client, auth, trip):
+    stop_id = trip["stops"][0]["id"]
+    # The first activity of a stop and category also creates its spend
+    # breakdown row (in a savepoint); later ones only update it
+    for max_statements in (10, 7):
+        response = assert_query_budget(
+            client, "POST", f"/trips/stops/{stop_id}/activities", max_statements=max_statements, max_repeats=1,
+            json={"title": "Museum", "category": "Activity", "cost": 12.5}, headers=auth,
+        )
+        assert response.status_code == 200
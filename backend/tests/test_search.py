@@ -0,0 +1,46 @@
+from sqlalchemy import text
+from sqlmodel import Session
+
+from App.database import engine
+from App.search import ACTIVITY, STOP
+
+def search(client, auth, query: str) -> list:
+    response = client.get("/trips/search", params={"q": query}, headers=auth)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def document(doc_id: int):
+    with Session(engine) as session:
+        return session.exec(
+            text("SELECT trip_id, body FROM search_document WHERE rowid = :doc_id").bindparams(doc_id=doc_id)
+        ).first()
+
+def test_stop_hit(client, auth, make_trip):
+    # Only the second stop mentions the word: neither the title nor the
+    # destination (the first stop) does
+    trip = make_trip(("Antigua", "Quetzaltenango"))
+    stop_id = trip["stops"][1]["id"]
+    assert tuple(document(stop_id * 4 + STOP)) == (trip["id"], "Quetzaltenango")
+
+    assert [hit["id"] for hit in search(client, auth, "quetzal")] == [trip["id"]]
+
+def test_activity_hit(client, auth, trip):
+    stop_id = trip["stops"][0]["id"]
+    response = client.post(
+        f"/trips/stops/{stop_id}/activities",
+        json={"title": "Chocolate workshop", "description": "Xocolatl tasting", "cost": 30}, headers=auth,
+    )
+    activity_id = response.json()["id"]
+    assert tuple(document(activity_id * 4 + ACTIVITY)) == (trip["id"], "Chocolate workshop Xocolatl tasting")
+
+    hits = search(client, auth, "xocolat")
+    assert [hit["id"] for hit in hits] == [trip["id"]]
+    assert hits[0]["score"] > 0
+
+def test_other_users_private_trip_is_not_found(client, auth, make_user, make_trip):
+    make_trip(("Ouagadougou",))
+    assert search(client, auth, "ouagadougou")
+    assert search(client, make_user(), "ouagadougou") == []
+
+def test_query_without_words(client, auth):
+    assert client.get("/trips/search", params={"q": "!!"}, headers=auth).status_code == 400
@@ -0,0 +1,30 @@
+import pytest
+
+from App.storage import UPLOAD_DIR
+
+STEM = "ab" * 32
+
+@pytest.fixture
+def thumbnail():
+    paths = [UPLOAD_DIR / f"{STEM}_64.jpg", UPLOAD_DIR / f"{STEM}_64.webp", UPLOAD_DIR / f"{STEM}_64.jpg.gz"]
+    for path in paths:
+        path.write_bytes(path.suffix.encode())
+    yield f"/static/{STEM}_64.jpg"
+    for path in paths:
+        path.unlink()
+
+def test_webp_thumbnail_is_negotiated(client, thumbnail):
+    response = client.get(thumbnail, headers={"Accept": "image/webp,*/*", "Accept-Encoding": "gzip"})
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    # Images are served as they are, stray siblings or not
+    assert "content-encoding" not in response.headers
+    assert response.content == b".webp"
+
+    response = client.get(thumbnail, headers={"Accept": "image/jpeg"})
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content == b".jpg"
+
+    etag = response.headers["etag"]
+    assert client.get(thumbnail, headers={"Accept": "image/jpeg", "If-None-Match": etag}).status_code == 304
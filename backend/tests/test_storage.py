@@ -0,0 +1,68 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, select
+
+import gc_uploads
+from App import storage
+from App.config import settings
+from App.database import engine
+from App.models import StoredBlob, User
+
+DAY = 24 * 3600
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_DIR", tmp_path)
+    return tmp_path
+
+def old_file(directory, name: str):
+    path = directory / name
+    path.write_bytes(name.encode())
+    two_days_ago = time.time() - 2 * DAY
+    os.utime(path, (two_days_ago, two_days_ago))
+
+def run_gc(monkeypatch, dry_run: bool = False):
+    # Own engine: the app's pool belongs to the TestClient's event loop
+    gc_engine = create_async_engine(settings.resolved_async_database_url)
+    monkeypatch.setattr(gc_uploads, "async_engine", gc_engine)
+
+    async def collect():
+        try:
+            await gc_uploads.collect(grace_hours=24, dry_run=dry_run)
+        finally:
+            await gc_engine.dispose()
+    asyncio.run(collect())
+
+def test_gc_keeps_referenced_blob(client, auth, uploads, monkeypatch):
+    for name in ("aaa1.png", "aaa1_64.webp", "bbb2.png", "ccc3.png", "ddd4.png"):
+        old_file(uploads, name)
+    with Session(engine) as session:
+        # Referenced, but its count drifted to 0: the recount must save it
+        user = session.exec(select(User).order_by(User.id.desc())).first()
+        user.avatar_url = "/static/aaa1.png"
+        session.add(user)
+        session.add(StoredBlob(name="aaa1.png", ref_count=0, updated_at=datetime.utcnow() - timedelta(days=2)))
+        # Released an hour ago: still inside the grace period
+        session.add(StoredBlob(name="ccc3.png", ref_count=0, updated_at=datetime.utcnow() - timedelta(hours=1)))
+        # Released long ago: collected, row and file
+        session.add(StoredBlob(name="ddd4.png", ref_count=0, updated_at=datetime.utcnow() - timedelta(days=2)))
+        session.commit()
+
+    run_gc(monkeypatch)
+
+    # bbb2.png was never referenced at all
+    assert sorted(path.name for path in uploads.iterdir()) == ["aaa1.png", "aaa1_64.webp", "ccc3.png"]
+    with Session(engine) as session:
+        counts = dict(session.exec(select(StoredBlob.name, StoredBlob.ref_count)).all())
+    assert counts["aaa1.png"] == 1
+    assert "ddd4.png" not in counts
+
+def test_gc_dry_run_changes_nothing(client, uploads, monkeypatch):
+    old_file(uploads, "eee5.png")
+    run_gc(monkeypatch, dry_run=True)
+    assert [path.name for path in uploads.iterdir()] == ["eee5.png"]